@@ -1,11 +1,14 @@
 import os
+import json
 import logging
-from datetime import datetime
+from datetime import datetime, timezone
 from flask import Flask, render_template, redirect, url_for, flash, request, session, jsonify
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from email_validator import validate_email, EmailNotValidError
-from utils.data_manager import DataManager
+from utils.data_manager import DataReader
+from utils.paytable import load_paytable
+from utils.metrics import metrics_file
 from db import db
 from models import User
 
@@ -29,8 +32,17 @@ db.init_app(app)
 login_manager = LoginManager(app)
 login_manager.login_view = 'login'
 
-# Initialize data manager for Discord bot data
-bot_data_manager = DataManager()
+# Read-only view of the Discord bot's data; the bot process owns all writes
+bot_data_manager = DataReader()
+
+# Leaderboard pages are built once per data version and reused until it changes
+LEADERBOARD_PAGE_SIZE = 20
+LEADERBOARD_MAX_LIMIT = 100
+_leaderboard_pages = {}
+_leaderboard_version = None
+
+# Body of /api/slot-symbols with the paytable version it was built from
+_slot_symbols_body = None
 
 @login_manager.user_loader
 def load_user(user_id):
@@ -53,28 +65,84 @@ def index():
     """Homepage with bot information and links."""
     return render_template('index.html')
 
+def get_leaderboard_page(offset, limit):
+    """
+    Get a page of the global leaderboard from the snapshot of the current data version.
+    
+    Args:
+        offset (int): Number of users to skip from the top
+        limit (int): Number of users on the page
+        
+    Returns:
+        list: Entries with rank, discord_id, balance and username (if known)
+    """
+    global _leaderboard_version
+    
+    if _leaderboard_version != bot_data_manager.version:
+        _leaderboard_pages.clear()
+        _leaderboard_version = bot_data_manager.version
+    
+    page = _leaderboard_pages.get((offset, limit))
+    if page is None:
+        page = []
+        for rank, (user_id, data) in enumerate(bot_data_manager.range(offset, offset + limit), offset + 1):
+            entry = {"rank": rank, "discord_id": str(user_id), "balance": data["balance"]}
+            if "username" in data:
+                entry["username"] = data["username"]
+            page.append(entry)
+        _leaderboard_pages[(offset, limit)] = page
+    return page
+
+def leaderboard_etag(offset, limit):
+    """ETag of a leaderboard page, which changes with every bot data version."""
+    return f"lb-{bot_data_manager.version}-{offset}-{limit}"
+
+def conditional_response(response, etag):
+    """
+    Attach validators to a response and turn it into a 304 if the client's copy is current.
+    
+    Args:
+        response: Flask response for the current data
+        etag (str): Entity tag of the response
+        
+    Returns:
+        Flask response, with status 304 when If-None-Match or If-Modified-Since match
+    """
+    response.set_etag(etag)
+    response.last_modified = datetime.fromtimestamp(bot_data_manager.updated_at, timezone.utc)
+    response.cache_control.no_cache = True  # Always revalidate, the data changes constantly
+    return response.make_conditional(request)
+
+def not_modified(etag):
+    """Check whether the client already has the current version of a response."""
+    return etag in request.if_none_match
+
 @app.route('/leaderboard')
 def leaderboard():
-    """Display the global gambling leaderboard."""
-    # Get all user data from the bot
-    all_data = bot_data_manager.get_all_data()
+    """Display the global gambling leaderboard, one page at a time."""
+    bot_data_manager.refresh()
+    total = bot_data_manager.user_count()
+    pages = max(1, -(-total // LEADERBOARD_PAGE_SIZE))
+    page = min(max(request.args.get('page', 1, type=int), 1), pages)
+    offset = (page - 1) * LEADERBOARD_PAGE_SIZE
     
-    # Sort by balance, highest first
-    sorted_data = sorted(
-        all_data.items(),
-        key=lambda x: x[1]["balance"],
-        reverse=True
-    )
+    etag = leaderboard_etag(offset, LEADERBOARD_PAGE_SIZE)
+    if not_modified(etag):
+        return conditional_response(app.response_class(), etag)
     
-    # Limit to top 20
-    top_users = sorted_data[:20]
+    # Served from the snapshot; the page is read from the balance index, never a full sort
+    entries = get_leaderboard_page(offset, LEADERBOARD_PAGE_SIZE)
+    html = render_template('leaderboard.html', leaderboard_data=entries, page=page, pages=pages)
     
-    return render_template('leaderboard.html', leaderboard_data=top_users)
+    # The page shows the login state, so it must not be shared between users
+    response = conditional_response(app.make_response(html), etag)
+    response.vary.add('Cookie')
+    return response
 
 @app.route('/how-to-play')
 def how_to_play():
     """Display information about how to use the bot and play games."""
-    return render_template('how_to_play.html')
+    return render_template('how_to_play.html', paytable=load_paytable())
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -182,7 +250,7 @@ def link_discord():
             return render_template('link_discord.html')
         
         # Validate that it's a numeric ID
-        if not discord_id.isdigit():
+        if not discord_id.isdecimal():
             flash('Discord ID must be a numeric value', 'danger')
             return render_template('link_discord.html')
         
@@ -204,19 +272,78 @@ def link_discord():
 @app.route('/api/slot-symbols')
 def slot_symbols():
     """API endpoint to get slot machine symbols and payouts"""
-    # This could be expanded to pull data from the actual slot machine
-    symbols = {
-        "7️⃣": {"type": "Rare", "payout_3": 500, "payout_2": 25},
-        "💎": {"type": "Uncommon", "payout_3": 25, "payout_2": 10},
-        "🎰": {"type": "Wild", "payout_3": 5, "payout_2": 3, "special": "Replaces any symbol except Scatter"},
-        "*️⃣": {"type": "Scatter", "payout_3": 3, "payout_2": 2, "special": "Counts anywhere on the line"},
-        "🔔": {"type": "Medium", "payout_3": 2, "payout_2": 1},
-        "🍊": {"type": "Common", "payout_3": 1, "payout_2": 1},
-        "🍋": {"type": "Common", "payout_3": 0.75, "payout_2": 1},
-        "❤️": {"type": "Common", "payout_3": 0.5, "payout_2": 0.75},
-        "🍒": {"type": "Common", "payout_3": 0.5, "payout_2": 0.25}
-    }
-    return jsonify({"symbols": symbols})
+    global _slot_symbols_body
+    
+    # Checking the paytable config costs a stat(); the body is only rebuilt when it changes
+    paytable = load_paytable()
+    etag = f"paytable-{paytable.version}"
+    
+    if _slot_symbols_body is None or _slot_symbols_body[0] != paytable.version:
+        symbols = {}
+        for row in paytable.rows():
+            symbols[row["symbol"]] = {"type": row["type"], "payout_3": row["payout_3"], "payout_2": row["payout_2"]}
+            if row["special"]:
+                symbols[row["symbol"]]["special"] = row["special"]
+        _slot_symbols_body = (paytable.version, json.dumps({"version": paytable.version, "symbols": symbols}))
+    
+    response = app.response_class(_slot_symbols_body[1], mimetype='application/json')
+    response.set_etag(etag)  # Strong: the body is identical for every request with this version
+    response.cache_control.public = True
+    response.cache_control.no_cache = True  # Revalidate so paytable changes show up straight away
+    return response.make_conditional(request)
+
+@app.route('/api/rank/<discord_id>')
+def api_rank(discord_id):
+    """API endpoint to get a Discord user's global leaderboard rank"""
+    rank = bot_data_manager.rank(discord_id) if discord_id.isdecimal() else None
+    if rank is None:
+        return jsonify({"error": "User not found"}), 404
+    
+    return jsonify({
+        "discord_id": discord_id,
+        "rank": rank,
+        "total": bot_data_manager.user_count(),
+        "percentile": bot_data_manager.percentile(discord_id),
+        "balance": bot_data_manager.get_user_data(discord_id)["balance"]
+    })
+
+@app.route('/api/leaderboard')
+def api_leaderboard():
+    """API endpoint to get a page of the global leaderboard"""
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', LEADERBOARD_PAGE_SIZE, type=int), 1), LEADERBOARD_MAX_LIMIT)
+    
+    bot_data_manager.refresh()
+    etag = leaderboard_etag(offset, limit)
+    if not_modified(etag):
+        return conditional_response(app.response_class(), etag)
+    
+    response = jsonify({
+        "version": bot_data_manager.version,
+        "offset": offset,
+        "limit": limit,
+        "total": bot_data_manager.user_count(),
+        "entries": get_leaderboard_page(offset, limit)
+    })
+    return conditional_response(response, etag)
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics exported by the Discord bot process"""
+    path = metrics_file()
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            exposition = f.read()
+        age = datetime.now(timezone.utc).timestamp() - os.path.getmtime(path)
+    except FileNotFoundError:
+        return app.response_class("# The bot has not exported any metrics yet\n", status=503, mimetype='text/plain')
+    
+    # How stale the bot's export is, so scrapes can tell a stopped bot from an idle one
+    exposition += f"casino_metrics_age_seconds {age:.3f}\n"
+    response = app.response_class(exposition, mimetype='text/plain')
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    response.cache_control.no_store = True
+    return response
 
 # Create database tables
 with app.app_context():
@@ -4,36 +4,115 @@ import logging
 import os
 import asyncio
 
+from utils.data_manager import get_data_manager, close_data_manager
+from utils.startup import StartupTimer
+from utils.render_cache import RenderCache
+from utils.metrics import metrics, metrics_file, phase, RateLimitCounter
+from utils.profiling import profiler
+
 logger = logging.getLogger(__name__)
 
-def setup_bot():
+METRICS_EXPORT_INTERVAL = 15  # Seconds between writes of the metrics file served at /metrics
+
+class CasinoBot(commands.Bot):
+    """Bot that writes out all pending user data when it shuts down."""
+    
+    commands_version = 0  # Bumped whenever a command is added or removed
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        
+        # Count time in Discord API calls, including rate limit waits, towards the command making them
+        request = self.http.request
+        
+        async def timed_request(route, *args, **kwargs):
+            with phase("discord", f"discord:{route.method} {route.path}"):
+                return await request(route, *args, **kwargs)
+        
+        self.http.request = timed_request
+    
+    def add_command(self, command):
+        super().add_command(command)
+        self.commands_version += 1
+    
+    def remove_command(self, name):
+        command = super().remove_command(name)
+        self.commands_version += 1
+        return command
+    
+    async def close(self):
+        profiler.stop()
+        await super().close()
+        
+        # Commands have stopped; wait for the data writer off the event loop
+        await asyncio.to_thread(close_data_manager)
+        logger.info("User data flushed and closed")
+
+def setup_bot(startup: StartupTimer = None):
     """
     Configure and set up the Discord bot with necessary settings and cogs.
     
+    Args:
+        startup (StartupTimer, optional): Timer to record startup phases in
+    
     Returns:
         discord.ext.commands.Bot: The configured bot instance
     """
+    startup = startup or StartupTimer()
+    
     # Set up intents (privileges for the bot)
     intents = discord.Intents.default()
     intents.message_content = True
     intents.members = True
     
     # Create bot instance with command prefix '!' and configured intents
-    bot = commands.Bot(command_prefix='!', intents=intents, help_command=None)
+    bot = CasinoBot(command_prefix='!', intents=intents, help_command=None)
+    bot.startup = startup
+    bot.embeds = RenderCache()
+    bot.data_loaded = False  # Set once the startup data load has finished
+    logging.getLogger("discord.http").addHandler(RateLimitCounter(metrics))
+    startup.mark("setup")
     
     @bot.event
     async def on_ready():
         """Event triggered when the bot is ready and connected to Discord."""
         logger.info(f'Bot is online and logged in as {bot.user.name}')
+        if not startup.reported:
+            startup.mark("gateway")
+            startup.report()
         
         # Set the bot's activity/status
         await bot.change_presence(activity=discord.Game(name="!help for commands"))
         
         print(f"Bot is online as {bot.user.name}")
     
+    @bot.check
+    async def wait_for_data(ctx):
+        """Hold cog commands until user data has loaded, waiting off the event loop."""
+        if ctx.cog is not None and not bot.data_loaded:
+            # Blocks on the startup load in a worker thread, or loads the data if that failed
+            await asyncio.to_thread(get_data_manager)
+        return True
+    
+    @bot.before_invoke
+    async def start_command_timer(ctx):
+        """Start timing a command once its checks and cooldowns have passed."""
+        ctx.timer = metrics.start(ctx.command.qualified_name, trace=profiler.enabled)
+    
+    @bot.after_invoke
+    async def finish_command_timer(ctx):
+        """Record how long a command took, whether or not it succeeded."""
+        timer = getattr(ctx, "timer", None)
+        if timer is not None:
+            elapsed = metrics.finish(timer)
+            profiler.record(ctx, timer, elapsed)
+    
     @bot.event
     async def on_command_error(ctx, error):
         """Global error handler for bot commands."""
+        if ctx.command is not None:
+            metrics.error(ctx.command.qualified_name, type(getattr(error, "original", error)).__name__)
+        
         if isinstance(error, commands.CommandOnCooldown):
             # Handle cooldown errors
             cooldown = round(error.retry_after, 2)
@@ -47,6 +126,10 @@ def setup_bot():
             # Handle bad arguments (type conversion errors)
             await ctx.send("❌ Invalid argument provided. Please check your input and try again.")
             
+        elif isinstance(error, commands.CheckFailure):
+            # Handle missing permissions and commands used outside a server
+            await ctx.send("❌ You can't use this command here.")
+            
         elif isinstance(error, commands.CommandNotFound):
             # Ignore command not found errors
             pass
@@ -59,14 +142,53 @@ def setup_bot():
     # Load cogs (extensions)
     async def load_extensions():
         """Load all cog extensions."""
-        await bot.load_extension("cogs.gambling")
-        await bot.load_extension("cogs.economy")
+        await asyncio.gather(
+            bot.load_extension("cogs.gambling"),
+            bot.load_extension("cogs.economy")
+        )
         logger.info("All extensions loaded successfully")
     
+    async def load_data():
+        """Load user data off the event loop while the bot connects to the gateway."""
+        with startup.measure("data"):
+            data_manager = await asyncio.to_thread(get_data_manager)
+        bot.data_loaded = True
+        
+        # Saves, bytes written and queue depth of the data writer, and user cache counters
+        metrics.add_source("data", data_manager.write_stats)
+        metrics.add_source("cache", data_manager.cache_stats)
+        
+        # When users are loaded on demand, sort their balances for the leaderboards now
+        with startup.measure("index"):
+            await data_manager.build_index()
+    
+    async def export_metrics():
+        """Write the metrics file for the web app's /metrics route until the bot closes."""
+        path = metrics_file()
+        while not bot.is_closed():
+            try:
+                # Render on the event loop, where the metrics are updated, and write off it
+                exposition = metrics.render()
+                await asyncio.to_thread(metrics.write, path, exposition)
+            except Exception as e:
+                logger.error(f"Error exporting metrics: {str(e)}")
+            await asyncio.sleep(METRICS_EXPORT_INTERVAL)
+    
     # Setup hook to load extensions when the bot starts
     @bot.event
     async def setup_hook():
+        startup.mark("login")
         await load_extensions()
+        startup.mark("extensions")
+        
+        # Cogs only create the data manager on first use; start loading it now
+        # without holding up the gateway connection
+        bot.loop.create_task(load_data())
+        bot.loop.create_task(export_metrics())
+        
+        metrics.add_source("profiling", profiler.stats)
+        if profiler.enabled:
+            profiler.start()
     
     # Add a simple ping command
     @bot.command(name="ping", brief="Check if bot is responsive")
@@ -75,6 +197,87 @@ def setup_bot():
         latency = round(bot.latency * 1000)
         await ctx.send(f"🏓 Pong! Bot latency: {latency}ms")
     
+    @bot.command(name="stats", brief="Show command metrics (bot owner only)")
+    @commands.is_owner()
+    async def stats(ctx):
+        """Show per-command latency, where the time goes, data writes and rate limit hits."""
+        def ms(seconds):
+            if seconds is None:
+                return "-"
+            return f"{seconds * 1000:.1f}ms" if seconds < 0.01 else f"{seconds * 1000:.0f}ms"
+        
+        embed = discord.Embed(
+            title="📈 Bot Metrics",
+            description="p50 / p99 wall time per command, and the p99 of each phase",
+            color=0x7289DA
+        )
+        
+        busiest = sorted(metrics.commands.items(), key=lambda item: item[1].invocations, reverse=True)[:10]
+        for name, command_stats in busiest:
+            errors = sum(command_stats.errors.values())
+            phases = ", ".join(f"{phase_name} {ms(histogram.quantile(0.99))}" for phase_name, histogram in command_stats.phases.items())
+            embed.add_field(
+                name=f"!{name}",
+                value=(
+                    f"{command_stats.invocations:,} runs, {errors:,} errors\n"
+                    f"{ms(command_stats.duration.quantile(0.5))} / {ms(command_stats.duration.quantile(0.99))} ({phases})"
+                ),
+                inline=False
+            )
+        
+        sources = metrics.source_values()
+        data = sources.get("data", {})
+        animation = sources.get("animation", {})
+        embed.add_field(
+            name="Data",
+            value=(
+                f"{data.get('batches', 0):,} saves, {data.get('records_written', 0):,} records, "
+                f"{data.get('bytes_written', 0) / 1024:,.0f} KiB written\n"
+                f"Queue {data.get('queue_depth', 0):,}, {data.get('stalls', 0):,} stalls"
+            ),
+            inline=True
+        )
+        embed.add_field(
+            name="Discord",
+            value=(
+                f"{metrics.rate_limit_hits:,} rate limit hits\n"
+                f"{animation.get('calls_saved', 0):,} animation edits saved"
+            ),
+            inline=True
+        )
+        await ctx.send(embed=embed)
+    
+    @bot.command(name="profile", brief="Turn command profiling on or off (bot owner only)")
+    @commands.is_owner()
+    async def profile(ctx, mode: str = None):
+        """
+        Trace slow commands and sample the event loop with cProfile, without restarting.
+        
+        Args:
+            mode (str, optional): "on", "off", or "snapshot" to profile the next few seconds now;
+                shows the current state if omitted
+        """
+        mode = mode.lower() if mode else None
+        if mode == "on":
+            profiler.start()
+        elif mode == "off":
+            profiler.stop()
+        elif mode == "snapshot":
+            await ctx.send(f"⏱️ Profiling the event loop for {profiler.sample_seconds:.0f} seconds...")
+            path = await profiler.snapshot()
+            await ctx.send(f"✅ Saved `{path}`" if path else "❌ Could not take a snapshot right now.")
+            return
+        elif mode is not None:
+            await ctx.send("❌ Use `!profile on`, `!profile off` or `!profile snapshot`.")
+            return
+        
+        state = "on" if profiler.enabled else "off"
+        await ctx.send(
+            f"🔬 Profiling is **{state}**. {profiler.traced:,} commands traced, "
+            f"{profiler.slow:,} slower than {profiler.slow_threshold * 1000:.0f}ms written to `{profiler.trace_file}`, "
+            f"{profiler.snapshots:,} event loop snapshots in `{profiler.snapshot_dir}`."
+        )
+    
     # Custom help command
     @bot.command(name="help", brief="Shows help information")
     async def help_command(ctx, command_name=None):
@@ -84,78 +287,104 @@ def setup_bot():
         Args:
             command_name (str, optional): Specific command to get help for
         """
-        embed = discord.Embed(
-            title="🎰 Gambling Bot Help",
-            description="Here are the available commands:",
-            color=0x7289DA
-        )
+        # Help is built for every command at once and only again when commands change
+        entries = bot.embeds.get("help", bot.commands_version, build_help)
         
         if command_name:
             # Show help for specific command
             command = bot.get_command(command_name)
             if command:
-                embed.add_field(
-                    name=f"!{command.name}",
-                    value=command.help or "No description available",
-                    inline=False
-                )
-                embed.add_field(
-                    name="Usage",
-                    value=f"!{command.name} {command.signature}",
-                    inline=False
-                )
-                if isinstance(command, commands.Command) and command._buckets._cooldown:
-                    cooldown = command._buckets._cooldown
-                    embed.add_field(
-                        name="Cooldown",
-                        value=f"{cooldown.rate} uses every {cooldown.per} seconds",
-                        inline=False
-                    )
-            else:
-                embed.description = f"Command '{command_name}' not found."
-        else:
-            # Show general help
-            gambling_commands = []
-            economy_commands = []
-            other_commands = []
+                await ctx.send(embed=entries[command.qualified_name])
+                return
             
-            for command in bot.commands:
-                cmd_info = f"**!{command.name}** - {command.brief or 'No description'}"
-                
-                if command.cog_name == "Gambling":
-                    gambling_commands.append(cmd_info)
-                elif command.cog_name == "Economy":
-                    economy_commands.append(cmd_info)
-                else:
-                    other_commands.append(cmd_info)
-            
-            if gambling_commands:
-                embed.add_field(
-                    name="🎲 Gambling Commands",
-                    value="\n".join(gambling_commands),
-                    inline=False
-                )
-            
-            if economy_commands:
+            embed = help_embed()
+            embed.description = f"Command '{command_name}' not found."
+            await ctx.send(embed=embed)
+            return
+        
+        await ctx.send(embed=entries[None])
+    
+    def help_embed():
+        """Create an empty help embed."""
+        return discord.Embed(
+            title="🎰 Gambling Bot Help",
+            description="Here are the available commands:",
+            color=0x7289DA
+        )
+    
+    def build_help():
+        """
+        Build the general help embed and one help embed per command.
+        
+        Returns:
+            dict: Embeds keyed by qualified command name, with the general help under None
+        """
+        entries = {}
+        for command in bot.walk_commands():
+            embed = help_embed()
+            embed.add_field(
+                name=f"!{command.name}",
+                value=command.help or "No description available",
+                inline=False
+            )
+            embed.add_field(
+                name="Usage",
+                value=f"!{command.name} {command.signature}",
+                inline=False
+            )
+            if isinstance(command, commands.Command) and command._buckets._cooldown:
+                cooldown = command._buckets._cooldown
                 embed.add_field(
-                    name="💰 Economy Commands",
-                    value="\n".join(economy_commands),
+                    name="Cooldown",
+                    value=f"{cooldown.rate} uses every {cooldown.per} seconds",
                     inline=False
                 )
+            entries[command.qualified_name] = embed
+        
+        # General help, grouped by cog
+        embed = help_embed()
+        gambling_commands = []
+        economy_commands = []
+        other_commands = []
+        
+        for command in bot.commands:
+            cmd_info = f"**!{command.name}** - {command.brief or 'No description'}"
             
-            if other_commands:
-                embed.add_field(
-                    name="🔧 Other Commands",
-                    value="\n".join(other_commands),
-                    inline=False
-                )
-                
+            if command.cog_name == "Gambling":
+                gambling_commands.append(cmd_info)
+            elif command.cog_name == "Economy":
+                economy_commands.append(cmd_info)
+            else:
+                other_commands.append(cmd_info)
+        
+        if gambling_commands:
             embed.add_field(
-                name="ℹ️ Detailed Help",
-                value="Use `!help <command>` for more information about a specific command.",
+                name="🎲 Gambling Commands",
+                value="\n".join(gambling_commands),
                 inline=False
             )
         
-        await ctx.send(embed=embed)
+        if economy_commands:
+            embed.add_field(
+                name="💰 Economy Commands",
+                value="\n".join(economy_commands),
+                inline=False
+            )
+        
+        if other_commands:
+            embed.add_field(
+                name="🔧 Other Commands",
+                value="\n".join(other_commands),
+                inline=False
+            )
+            
+        embed.add_field(
+            name="ℹ️ Detailed Help",
+            value="Use `!help <command>` for more information about a specific command.",
+            inline=False
+        )
+        entries[None] = embed
+    
+        return entries
     
     return bot
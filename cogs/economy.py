@@ -2,7 +2,11 @@ import discord
 from discord.ext import commands
 import asyncio
 import datetime
-from utils.data_manager import DataManager
+from bisect import bisect_right
+from typing import Dict, Any, List, Set, Tuple
+from utils.data_manager import get_data_manager
+from utils.user_record import UserRecord, MAX_VOTE_NUMBER
+from utils.render_cache import RenderCache
 from utils.number_parser import parse_amount
 
 class Economy(commands.Cog):
@@ -10,7 +14,7 @@ class Economy(commands.Cog):
     
     def __init__(self, bot):
         self.bot = bot
-        self.data_manager = DataManager()
+        self._data_manager = None  # Loaded on first use, see data_manager
         self.daily_amount = 100  # Amount of coins given for daily reward
         
         # Vote multiplier configuration
@@ -24,6 +28,120 @@ class Economy(commands.Cog):
             {"range": (64, 83), "multiplier": 4, "reward": 400_000},
             {"range": (84, 84), "multiplier": 12, "reward": 1_200_000},
         ]
+        self.max_vote_number = MAX_VOTE_NUMBER  # Bounds the size of each user's vote bitmap
+        
+        # Tier start numbers in ascending order, for finding a vote's tier by bisection
+        self._vote_tier_starts = [data["range"][0] for data in self.vote_multipliers]
+        
+        # The vote tiers are fixed, so their embed is built once
+        self.embeds = RenderCache()
+        self.embeds.get("votemultipliers", None, self._vote_multipliers_embed)
+        
+        # Per-guild leaderboard cache: member ID sets kept current by member
+        # events, and materialized top lists dropped by any change that could affect them
+        self.leaderboard_size = 10
+        self._guild_members: Dict[int, Set[int]] = {}
+        self._user_guilds: Dict[int, Set[int]] = {}  # Reverse of _guild_members: user ID -> guild IDs
+        self._guild_top: Dict[int, List[Tuple[int, UserRecord]]] = {}
+        self._guild_top_ids: Dict[int, Set[int]] = {}  # User IDs on each cached top list
+    
+    @property
+    def data_manager(self):
+        """The shared DataManager, loaded on first use rather than when the cog is."""
+        if self._data_manager is None:
+            self._data_manager = get_data_manager()
+            self._data_manager.subscribe(self._on_data_change)
+        return self._data_manager
+    
+    def cog_unload(self):
+        """Stop listening for data changes when the cog is unloaded."""
+        if self._data_manager is not None:
+            self._data_manager.unsubscribe(self._on_data_change)
+    
+    def _on_data_change(self, changed: Set[int], version: int) -> None:
+        """Drop cached top lists that a balance change may have reordered."""
+        # Only the guilds the changed users are in can be affected
+        for user_id in changed:
+            for guild_id in self._user_guilds.get(user_id, ()):
+                top = self._guild_top.get(guild_id)
+                if top is None:
+                    continue
+                
+                # Only members already on the list, or now rich enough to join it, matter
+                if (user_id in self._guild_top_ids[guild_id] or len(top) < self.leaderboard_size
+                        or self.data_manager.get_user_data(user_id)["balance"] >= top[-1][1]["balance"]):
+                    self._drop_top(guild_id)
+    
+    def _cache_top(self, guild_id: int, top: List[Tuple[int, UserRecord]]) -> None:
+        """Cache a guild's top list until a change drops it."""
+        self._guild_top[guild_id] = top
+        self._guild_top_ids[guild_id] = {user_id for user_id, _ in top}
+    
+    def _drop_top(self, guild_id: int) -> None:
+        """Drop a guild's cached top list, if it has one."""
+        self._guild_top.pop(guild_id, None)
+        self._guild_top_ids.pop(guild_id, None)
+    
+    def _vote_tier(self, vote_number: int) -> Dict[str, Any]:
+        """
+        Find the multiplier tier of a vote number.
+        
+        Args:
+            vote_number (int): Vote number, at least 1
+            
+        Returns:
+            Dict[str, Any]: The tier containing the vote, or the highest tier past the defined ranges
+        """
+        index = bisect_right(self._vote_tier_starts, vote_number) - 1
+        tier = self.vote_multipliers[index]
+        if vote_number > tier["range"][1]:
+            return self.vote_multipliers[-1]
+        return tier
+    
+    def _get_guild_members(self, guild: discord.Guild) -> Set[int]:
+        """Get the cached member ID set of a guild, building it on first use."""
+        members = self._guild_members.get(guild.id)
+        if members is None:
+            members = {member.id for member in guild.members}
+            self._guild_members[guild.id] = members
+            for user_id in members:
+                self._user_guilds.setdefault(user_id, set()).add(guild.id)
+        return members
+    
+    def _forget_member(self, user_id: int, guild_id: int) -> None:
+        """Remove a guild from a user's entry in the reverse member index."""
+        guilds = self._user_guilds.get(user_id)
+        if guilds is not None:
+            guilds.discard(guild_id)
+            if not guilds:
+                del self._user_guilds[user_id]
+    
+    @commands.Cog.listener()
+    async def on_member_join(self, member: discord.Member):
+        """Keep the cached member set of the guild up to date."""
+        members = self._guild_members.get(member.guild.id)
+        if members is not None:
+            members.add(member.id)
+            self._user_guilds.setdefault(member.id, set()).add(member.guild.id)
+            if self.data_manager.has_user(member.id):
+                self._drop_top(member.guild.id)
+    
+    @commands.Cog.listener()
+    async def on_member_remove(self, member: discord.Member):
+        """Keep the cached member set of the guild up to date."""
+        members = self._guild_members.get(member.guild.id)
+        if members is not None:
+            members.discard(member.id)
+            self._forget_member(member.id, member.guild.id)
+            if member.id in self._guild_top_ids.get(member.guild.id, ()):
+                self._drop_top(member.guild.id)
+    
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild):
+        """Forget the caches of guilds the bot has left."""
+        for user_id in self._guild_members.pop(guild.id, ()):
+            self._forget_member(user_id, guild.id)
+        self._drop_top(guild.id)
     
     @commands.command(name="balance", aliases=["bal"], brief="Check your balance")
     async def balance(self, ctx, member: discord.Member = None):
@@ -81,28 +199,32 @@ class Economy(commands.Cog):
     async def daily(self, ctx):
         """Collect your daily reward of coins."""
         user_id = str(ctx.author.id)
-        user_data = self.data_manager.get_user_data(user_id)
-        
-        # Check if user has already claimed their daily reward
-        last_daily = user_data.get("last_daily")
-        now = datetime.datetime.now().timestamp()
         
-        # Check if 24 hours have passed since last claim
-        if last_daily and now - last_daily < 86400:  # 86400 seconds = 24 hours
-            # Calculate time remaining
-            time_left = 86400 - (now - last_daily)
-            hours, remainder = divmod(int(time_left), 3600)
-            minutes, seconds = divmod(remainder, 60)
+        # Lock the user from the claim check until the reward is committed
+        async with self.data_manager.lock_users(user_id):
+            user_data = self.data_manager.get_user_data(user_id)
             
-            # Format time string
-            time_str = f"{hours}h {minutes}m {seconds}s"
+            # Check if user has already claimed their daily reward
+            last_daily = user_data.get("last_daily")
+            now = datetime.datetime.now().timestamp()
             
-            await ctx.send(f"❌ You've already claimed your daily reward! Try again in **{time_str}**.")
-            return
-        
-        # Update user balance and last_daily timestamp
-        self.data_manager.update_balance(user_id, self.daily_amount)
-        self.data_manager.update_user_data(user_id, "last_daily", now)
+            # Check if 24 hours have passed since last claim
+            if last_daily and now - last_daily < 86400:  # 86400 seconds = 24 hours
+                # Calculate time remaining
+                time_left = 86400 - (now - last_daily)
+                hours, remainder = divmod(int(time_left), 3600)
+                minutes, seconds = divmod(remainder, 60)
+                
+                # Format time string
+                time_str = f"{hours}h {minutes}m {seconds}s"
+                
+                await ctx.send(f"❌ You've already claimed your daily reward! Try again in **{time_str}**.")
+                return
+            
+            # Update user balance and last_daily timestamp
+            with self.data_manager.transaction():
+                self.data_manager.update_balance(user_id, self.daily_amount)
+                self.data_manager.update_user_data(user_id, "last_daily", now)
         
         # Get updated balance
         user_data = self.data_manager.get_user_data(user_id)
@@ -131,25 +253,14 @@ class Economy(commands.Cog):
     @commands.command(name="leaderboard", aliases=["lb"], brief="Show server leaderboard")
     async def leaderboard(self, ctx):
         """Display the server's gambling leaderboard."""
-        # Get all users' data
-        all_data = self.data_manager.get_all_data()
-        
-        # Filter users who are in this server and sort by balance
-        server_members_ids = [str(member.id) for member in ctx.guild.members]
-        server_data = {
-            user_id: data for user_id, data in all_data.items() 
-            if user_id in server_members_ids
-        }
-        
-        # Sort by balance, highest first
-        sorted_data = sorted(
-            server_data.items(), 
-            key=lambda x: x[1]["balance"], 
-            reverse=True
-        )
-        
-        # Limit to top 10
-        top_users = sorted_data[:10]
+        # Top 10 of this server's members, rebuilt from the balance index
+        # only when a change invalidated the cached list
+        top_users = self._guild_top.get(ctx.guild.id)
+        if top_users is None:
+            server_members_ids = self._get_guild_members(ctx.guild)
+            await self.data_manager.build_index()
+            top_users = self.data_manager.top_members(server_members_ids, self.leaderboard_size)
+            self._cache_top(ctx.guild.id, top_users)
         
         # Check if there's data to show
         if not top_users:
@@ -166,7 +277,7 @@ class Economy(commands.Cog):
         # Add leaderboard entries
         for index, (user_id, data) in enumerate(top_users, 1):
             # Try to get member from server
-            member = ctx.guild.get_member(int(user_id))
+            member = ctx.guild.get_member(user_id)
             name = member.display_name if member else f"User {user_id}"
             
             # Medal for top 3
@@ -187,6 +298,41 @@ class Economy(commands.Cog):
         
         await ctx.send(embed=embed)
     
+    @commands.command(name="rank", brief="Show your global leaderboard rank")
+    async def rank(self, ctx, member: discord.Member = None):
+        """
+        Show where you or another user stand on the global leaderboard.
+        
+        Args:
+            member (discord.Member, optional): The member whose rank to show
+        """
+        target = member or ctx.author
+        user_id = str(target.id)
+        
+        await self.data_manager.build_index()
+        rank = self.data_manager.rank(user_id)
+        if rank is None:
+            await ctx.send(f"❌ {target.display_name} hasn't played yet!")
+            return
+        
+        user_data = self.data_manager.get_user_data(user_id)
+        total = self.data_manager.user_count()
+        percentile = self.data_manager.percentile(user_id)
+        
+        embed = discord.Embed(
+            title=f"{target.display_name}'s Rank",
+            description=f"🏆 **#{rank:,}** of {total:,} players",
+            color=0xF1C40F
+        )
+        
+        embed.add_field(name="Balance", value=f"💰 **{user_data['balance']:,}** coins", inline=True)
+        embed.add_field(name="Percentile", value=f"Richer than **{percentile:.1f}%** of players", inline=True)
+        
+        if target.avatar:
+            embed.set_thumbnail(url=target.avatar.url)
+        
+        await ctx.send(embed=embed)
+    
     @commands.command(name="vote", brief="Claim your vote reward")
     async def vote(self, ctx, vote_number: int):
         """
@@ -196,43 +342,34 @@ class Economy(commands.Cog):
             vote_number (int): Your current vote number
         """
         user_id = str(ctx.author.id)
-        user_data = self.data_manager.get_user_data(user_id)
         
-        # Check if vote number is valid
-        if vote_number < 1:
-            await ctx.send("❌ Invalid vote number. Please enter a positive number.")
-            return
+        # Lock the user from the claim check until the reward is committed
+        async with self.data_manager.lock_users(user_id):
+            # Check if vote number is valid
+            if vote_number < 1:
+                await ctx.send("❌ Invalid vote number. Please enter a positive number.")
+                return
+            if vote_number > self.max_vote_number:
+                await ctx.send(f"❌ Invalid vote number. Vote numbers go up to {self.max_vote_number:,}.")
+                return
+                
+            # Check if vote has already been claimed
+            if self.data_manager.has_claimed_vote(user_id, vote_number):
+                await ctx.send(f"❌ You've already claimed the reward for vote #{vote_number}!")
+                return
+                
+            # Find applicable multiplier
+            multiplier_data = self._vote_tier(vote_number)
             
-        # Check if vote has already been claimed
-        claimed_votes = user_data.get("claimed_votes", [])
-        if vote_number in claimed_votes:
-            await ctx.send(f"❌ You've already claimed the reward for vote #{vote_number}!")
-            return
+            # Add reward
+            reward = multiplier_data["reward"]
+            multiplier = multiplier_data["multiplier"]
             
-        # Find applicable multiplier
-        multiplier_data = None
-        for data in self.vote_multipliers:
-            min_vote, max_vote = data["range"]
-            if min_vote <= vote_number <= max_vote:
-                multiplier_data = data
-                break
+            with self.data_manager.transaction():
+                self.data_manager.update_balance(user_id, reward)
                 
-        if not multiplier_data:
-            # Use the highest tier if the vote number exceeds our defined ranges
-            multiplier_data = self.vote_multipliers[-1]
-        
-        # Add reward
-        reward = multiplier_data["reward"]
-        multiplier = multiplier_data["multiplier"]
-        
-        self.data_manager.update_balance(user_id, reward)
-        
-        # Mark vote as claimed
-        if "claimed_votes" not in user_data:
-            self.data_manager.update_user_data(user_id, "claimed_votes", [vote_number])
-        else:
-            claimed_votes.append(vote_number)
-            self.data_manager.update_user_data(user_id, "claimed_votes", claimed_votes)
+                # Mark vote as claimed
+                self.data_manager.claim_vote(user_id, vote_number)
             
         # Get updated balance
         user_data = self.data_manager.get_user_data(user_id)
@@ -280,6 +417,10 @@ class Economy(commands.Cog):
     @commands.command(name="votemultipliers", aliases=["vm"], brief="Show vote multipliers")
     async def vote_multipliers(self, ctx):
         """Display the vote multiplier tiers and rewards."""
+        await ctx.send(embed=self.embeds.get("votemultipliers", None, self._vote_multipliers_embed))
+    
+    def _vote_multipliers_embed(self) -> discord.Embed:
+        """Build the !votemultipliers embed."""
         embed = discord.Embed(
             title="🗳️ Vote Multiplier System",
             description="Vote for the bot to earn rewards! More votes = bigger multipliers.",
@@ -303,7 +444,7 @@ class Economy(commands.Cog):
             embed.add_field(name=name, value=value, inline=False)
             
         embed.set_footer(text="Use !vote <number> to claim your reward")
-        await ctx.send(embed=embed)
+        return embed
     
     @commands.command(name="give", brief="Give coins to another user")
     async def give(self, ctx, member: discord.Member, amount: str):
@@ -364,9 +505,17 @@ class Economy(commands.Cog):
             await ctx.send("❌ Transaction cancelled.")
             return
         
-        # Process transaction
-        self.data_manager.update_balance(sender_id, -parsed_amount)
-        self.data_manager.update_balance(receiver_id, parsed_amount)
+        # Process transaction, re-checking the balance since it may have
+        # changed while we waited for confirmation
+        async with self.data_manager.lock_users(sender_id, receiver_id):
+            sender_data = self.data_manager.get_user_data(sender_id)
+            if sender_data["balance"] < parsed_amount:
+                await ctx.send(f"❌ You don't have enough coins! Your balance: {sender_data['balance']} coins")
+                return
+            
+            with self.data_manager.transaction():
+                self.data_manager.update_balance(sender_id, -parsed_amount)
+                self.data_manager.update_balance(receiver_id, parsed_amount)
         
         # Get updated balances
         sender_data = self.data_manager.get_user_data(sender_id)
@@ -1,18 +1,65 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 import asyncio
+import logging
 import random
-from utils.data_manager import DataManager
+from utils.data_manager import get_data_manager
 from utils.slot_machine import SlotMachine
+from utils.paytable import load_paytable
+from utils.animation import AnimationScheduler
+from utils.render_cache import RenderCache
+from utils.metrics import metrics, phase
 from utils.number_parser import parse_amount
 
+logger = logging.getLogger(__name__)
+
 class Gambling(commands.Cog):
     """Gambling game commands for the bot."""
     
     def __init__(self, bot):
         self.bot = bot
-        self.data_manager = DataManager()
         self.slot_machine = SlotMachine()
+        self.animator = AnimationScheduler()
+        self._guild_settings_applied = False  # Stored instant spin settings, applied on first data access
+        
+        # Informational embeds, rebuilt only when the paytable changes
+        self.embeds = RenderCache()
+        self.embeds.get("symbols", self.slot_machine.version, self._symbols_embed)
+        self.embeds.get("odds", self.slot_machine.version, self._odds_embed)
+    
+    @property
+    def data_manager(self):
+        """The shared DataManager, loaded on first use rather than when the cog is."""
+        data_manager = get_data_manager()
+        if not self._guild_settings_applied:
+            # Settings saved with !instantspin override INSTANT_SPIN_GUILDS
+            for guild_id, settings in data_manager.guild_settings.items():
+                if "instant_spin" in settings:
+                    self.animator.set_instant(guild_id, settings["instant_spin"])
+            self._guild_settings_applied = True
+        return data_manager
+    
+    async def cog_load(self):
+        self.watch_paytable.start()
+        metrics.add_source("animation", self.animator.stats)
+    
+    async def cog_unload(self):
+        self.watch_paytable.cancel()
+        metrics.remove_source("animation")
+    
+    @tasks.loop(seconds=30)
+    async def watch_paytable(self):
+        """Switch to the paytable in the config file when it changes, as the website does."""
+        try:
+            paytable = await asyncio.to_thread(load_paytable)
+        except Exception as e:
+            logger.error(f"Error loading paytable: {str(e)}")
+            return
+        
+        if paytable.version != self.slot_machine.version:
+            # Embeds built from the old paytable are rebuilt on their next use
+            self.slot_machine.load(paytable)
+            logger.info(f"Switched to paytable {paytable.version}")
     
     @commands.command(name="slot", brief="Play the slot machine")
     @commands.cooldown(1, 5, commands.BucketType.user)
@@ -46,58 +93,59 @@ class Gambling(commands.Cog):
             ctx.command.reset_cooldown(ctx)
             return
         
-        # Get user balance
         user_id = str(ctx.author.id)
-        user_data = self.data_manager.get_user_data(user_id)
         
-        # Check if user has enough balance
-        if user_data["balance"] < bet:
-            await ctx.send(f"❌ You don't have enough coins! Your balance: {user_data['balance']} coins")
-            ctx.command.reset_cooldown(ctx)
-            return
+        # Lock the user from the balance check until the spin is settled
+        async with self.data_manager.lock_users(user_id):
+            # Get user balance
+            user_data = self.data_manager.get_user_data(user_id)
+            
+            # Check if user has enough balance
+            if user_data["balance"] < bet:
+                await ctx.send(f"❌ You don't have enough coins! Your balance: {user_data['balance']} coins")
+                ctx.command.reset_cooldown(ctx)
+                return
+            
+            # Spin up front so the bet and its outcome are settled in one commit;
+            # the animation below is purely cosmetic
+            result = self.slot_machine.spin()
+            
+            # Calculate winnings
+            winnings = bet * result["multiplier"]
+            
+            with self.data_manager.transaction():
+                # Deduct bet from balance and add any winnings
+                self.data_manager.update_balance(user_id, winnings - bet)
+                
+                # Update user statistics
+                self.data_manager.update_stats(user_id, "slots_played", 1)
+                
+                if winnings > 0:
+                    self.data_manager.update_stats(user_id, "slots_won", 1)
+                    if winnings > user_data.get("stats", {}).get("highest_win", 0):
+                        self.data_manager.set_stat(user_id, "highest_win", winnings)
         
-        # Deduct bet from balance
-        self.data_manager.update_balance(user_id, -bet)
+        user_data = self.data_manager.get_user_data(user_id)
         
-        # Create initial message
-        embed = discord.Embed(
+        # Build the animation frames; the scheduler decides which of them are shown
+        spinning = discord.Embed(
             title="🎰 Slot Machine",
             description="Spinning...",
             color=0xF1C40F
         )
-        embed.set_footer(text=f"Bet: {bet} coins | Balance: {user_data['balance'] - bet} coins")
-        message = await ctx.send(embed=embed)
+        spinning.set_footer(text=f"Bet: {bet} coins | Balance: {user_data['balance'] - winnings} coins")
+        frames = [spinning]
         
-        # Animated spinning effect
         for _ in range(3):
             # Generate random symbols for animation
-            symbols = [random.choice(list(self.slot_machine.SYMBOLS)) for _ in range(3)]
-            symbols_display = " | ".join(symbols)
-            
-            embed.description = f"**[ {symbols_display} ]**"
-            await message.edit(embed=embed)
-            await asyncio.sleep(0.5)
+            with phase("rng"):
+                symbols = [random.choice(list(self.slot_machine.SYMBOLS)) for _ in range(3)]
+            frame = spinning.copy()
+            frame.description = f"**[ {' | '.join(symbols)} ]**"
+            frames.append(frame)
         
-        # Get actual slot results
-        result = self.slot_machine.spin()
         symbols_display = " | ".join(result["symbols"])
         
-        # Calculate winnings
-        winnings = bet * result["multiplier"]
-        
-        # Update user balance with winnings
-        if winnings > 0:
-            self.data_manager.update_balance(user_id, winnings)
-        
-        # Update user statistics
-        user_data = self.data_manager.get_user_data(user_id)
-        self.data_manager.update_stats(user_id, "slots_played", 1)
-        
-        if winnings > 0:
-            self.data_manager.update_stats(user_id, "slots_won", 1)
-            if winnings > user_data.get("stats", {}).get("highest_win", 0):
-                self.data_manager.update_stats(user_id, "highest_win", winnings)
-        
         # Prepare result message
         embed = discord.Embed(color=0xF1C40F)
         embed.set_author(name=f"{ctx.author.display_name}'s Slot Machine", icon_url=ctx.author.avatar.url if ctx.author.avatar else None)
@@ -118,60 +166,162 @@ class Gambling(commands.Cog):
         current_balance = user_data["balance"]
         embed.set_footer(text=f"Bet: {bet} coins | New Balance: {current_balance} coins")
         
-        await message.edit(embed=embed)
+        await self.animator.play(ctx.channel, frames, embed)
+    
+    @commands.command(name="instantspin", brief="Turn slot animations on or off for this server")
+    @commands.guild_only()
+    @commands.has_permissions(manage_guild=True)
+    async def instantspin(self, ctx, mode: str = None):
+        """
+        Show slot results straight away instead of animating them, for busy servers.
+        
+        Args:
+            mode (str, optional): "on" or "off"; shows the current setting if omitted
+        """
+        data_manager = self.data_manager  # Applies the saved settings first
+        if mode is not None:
+            if mode.lower() not in ("on", "off"):
+                await ctx.send("❌ Use `!instantspin on` or `!instantspin off`.")
+                return
+            enabled = mode.lower() == "on"
+            self.animator.set_instant(ctx.guild.id, enabled)
+            data_manager.set_guild_setting(ctx.guild.id, "instant_spin", enabled)
+        
+        stats = self.animator.stats()
+        state = "on" if self.animator.is_instant(ctx.guild.id) else "off"
+        await ctx.send(
+            f"⚡ Instant spins are **{state}** for this server. "
+            f"Animations have saved {stats['calls_saved']:,} of {stats['calls'] + stats['calls_saved']:,} message edits since the bot started."
+        )
+    
+    @commands.command(name="autospin", brief="Play many slot spins at once")
+    @commands.cooldown(1, 10, commands.BucketType.user)
+    async def autospin(self, ctx, count: int, bet_str: str):
+        """
+        Play the slot machine several times with the same bet and get one summary.
+        
+        Args:
+            count (int): Number of spins (1-100)
+            bet_str (str): Amount to bet per spin (can use k, m, g etc. suffixes)
+        """
+        minimum_bet = 10
+        max_spins = 100
+        
+        if not 1 <= count <= max_spins:
+            await ctx.send(f"❌ You can autospin between 1 and {max_spins} times.")
+            ctx.command.reset_cooldown(ctx)
+            return
+        
+        # Parse the bet with potential suffixes (k, m, g, etc.)
+        bet = parse_amount(bet_str)
+        if bet is None:
+            await ctx.send("❌ Invalid bet format. Please use a valid number. Example: 100, 1k, 2.5m")
+            ctx.command.reset_cooldown(ctx)
+            return
+        
+        if bet < minimum_bet:
+            await ctx.send(f"❌ Minimum bet is {minimum_bet} coins.")
+            ctx.command.reset_cooldown(ctx)
+            return
+        
+        user_id = str(ctx.author.id)
+        total_bet = bet * count
+        
+        # Lock the user from the balance check until all spins are settled
+        async with self.data_manager.lock_users(user_id):
+            user_data = self.data_manager.get_user_data(user_id)
+            
+            # The balance has to cover every spin up front
+            if user_data["balance"] < total_bet:
+                await ctx.send(f"❌ You need {total_bet:,} coins for {count} spins! Your balance: {user_data['balance']} coins")
+                ctx.command.reset_cooldown(ctx)
+                return
+            
+            # Resolve every spin in one batch
+            results = self.slot_machine.spin_many(count)
+            wins = [result for result in results if result["multiplier"] > 0]
+            total_won = sum(bet * result["multiplier"] for result in wins)
+            best = max(results, key=lambda result: result["multiplier"])
+            best_win = bet * best["multiplier"]
+            
+            # Settle the net result and stats in a single commit
+            with self.data_manager.transaction():
+                self.data_manager.update_balance(user_id, total_won - total_bet)
+                self.data_manager.update_stats(user_id, "slots_played", count)
+                
+                if wins:
+                    self.data_manager.update_stats(user_id, "slots_won", len(wins))
+                    if best_win > user_data.get("stats", {}).get("highest_win", 0):
+                        self.data_manager.set_stat(user_id, "highest_win", best_win)
+        
+        user_data = self.data_manager.get_user_data(user_id)
+        net = total_won - total_bet
+        
+        # Prepare summary message
+        embed = discord.Embed(
+            title="🎰 Autospin Results",
+            color=0x2ECC71 if net >= 0 else 0xE74C3C
+        )
+        embed.set_author(name=f"{ctx.author.display_name}'s Slot Machine", icon_url=ctx.author.avatar.url if ctx.author.avatar else None)
+        
+        embed.add_field(name="Spins", value=f"{count} × {bet:,} coins", inline=True)
+        embed.add_field(name="Hits", value=f"{len(wins)}/{count}", inline=True)
+        embed.add_field(name="Total Won", value=f"💰 **{total_won:,}** coins", inline=True)
+        
+        if net >= 0:
+            embed.add_field(name="Net Result", value=f"🎉 You're up **{net:,}** coins!", inline=False)
+        else:
+            embed.add_field(name="Net Result", value=f"😢 You're down **{-net:,}** coins.", inline=False)
+        
+        if best["multiplier"] > 0:
+            embed.add_field(
+                name="Best Hit",
+                value=f"**[ {' | '.join(best['symbols'])} ]**\n{best['pattern']} - **{best_win:,}** coins (x{best['multiplier']})",
+                inline=False
+            )
+        
+        embed.set_footer(text=f"Total Bet: {total_bet:,} coins | New Balance: {user_data['balance']} coins")
+        await ctx.send(embed=embed)
     
     @commands.command(name="symbols", brief="Show slot machine symbols and payouts")
     async def symbols(self, ctx):
         """Display information about slot machine symbols and their payouts."""
+        await ctx.send(embed=self.embeds.get("symbols", self.slot_machine.version, self._symbols_embed))
+    
+    def _symbols_embed(self) -> discord.Embed:
+        """Build the !symbols embed."""
         embed = discord.Embed(
             title="🎰 Slot Machine Symbols & Payouts",
             description="Here are all the slot machine symbols and their payouts:",
             color=0xF1C40F
         )
         
-        # Add each symbol group to the embed
-        embed.add_field(
-            name="Rare - 7️⃣",
-            value="3x = 500:1 payout\n2x = 25:1 payout",
-            inline=True
-        )
-        
-        embed.add_field(
-            name="Uncommon - 💎",
-            value="3x = 25:1 payout\n2x = 10:1 payout",
-            inline=True
-        )
-        
-        embed.add_field(
-            name="Wild - 🎰",
-            value="3x = 5:1 payout\n2x = 3:1 payout\nReplaces any symbol except Scatter",
-            inline=True
-        )
+        # One field per symbol type; types with several symbols list them together
+        groups = {}
+        for row in self.slot_machine.paytable.rows():
+            groups.setdefault(row["type"], []).append(row)
         
-        embed.add_field(
-            name="Scatter - *️⃣",
-            value="3x = 3:1 payout\n2x = 2:1 payout\nCounts anywhere on the line",
-            inline=True
-        )
-        
-        embed.add_field(
-            name="Medium - 🔔",
-            value="3x = 2:1 payout\n2x = 1:1 payout",
-            inline=True
-        )
-        
-        embed.add_field(
-            name="Common Symbols",
-            value="🍊: 3x = 1:1, 2x = 1:1\n🍋: 3x = 0.75:1, 2x = 1:1\n❤️: 3x = 0.5:1, 2x = 0.75:1\n🍒: 3x = 0.5:1, 2x = 0.25:1",
-            inline=True
-        )
+        for symbol_type, rows in groups.items():
+            if len(rows) == 1:
+                row = rows[0]
+                lines = [f"3x = {row['payout_3']:g}:1 payout", f"2x = {row['payout_2']:g}:1 payout"]
+                if row["special"]:
+                    lines.append(row["special"])
+                embed.add_field(name=f"{symbol_type} - {row['symbol']}", value="\n".join(lines), inline=True)
+            else:
+                lines = [f"{row['symbol']}: 3x = {row['payout_3']:g}:1, 2x = {row['payout_2']:g}:1" for row in rows]
+                embed.add_field(name=f"{symbol_type} Symbols", value="\n".join(lines), inline=True)
         
         embed.set_footer(text="Use !slot <bet> to play the slot machine")
-        await ctx.send(embed=embed)
+        return embed
     
     @commands.command(name="odds", brief="Show slot machine odds")
     async def odds(self, ctx):
         """Display information about slot machine odds."""
+        await ctx.send(embed=self.embeds.get("odds", self.slot_machine.version, self._odds_embed))
+    
+    def _odds_embed(self) -> discord.Embed:
+        """Build the !odds embed."""
         embed = discord.Embed(
             title="🎰 Slot Machine Odds",
             description="Here are the odds of winning in the slot machine:",
@@ -195,15 +345,27 @@ class Gambling(commands.Cog):
             inline=False
         )
         
-        # Add general odds information
+        # Add exact odds computed from the paytable (cached by the slot machine)
+        odds = self.slot_machine.odds()
         embed.add_field(
             name="Win Rates",
-            value="Any win: ~30%\nBreak-even or better: ~20%\nBig win (10x or more): ~1%",
+            value=(
+                f"Any win: {odds['hit_rate'] * 100:.2f}%\n"
+                f"Break-even or better: {odds['break_even_rate'] * 100:.2f}%\n"
+                f"Big win (10x or more): {odds['big_win_rate'] * 100:.2f}%\n"
+                f"Top prize ({odds['max_multiplier']}x): {odds['max_win_rate'] * 100:.4f}%"
+            ),
+            inline=False
+        )
+        
+        embed.add_field(
+            name="Return to Player",
+            value=f"{odds['rtp'] * 100:.2f}% of all bets are paid back on average",
             inline=False
         )
         
         embed.set_footer(text="The house always has an edge, but you might get lucky!")
-        await ctx.send(embed=embed)
+        return embed
 
 async def setup(bot):
     """Add the Gambling cog to the bot."""
@@ -1,16 +1,32 @@
 """
 Main entry point for the Discord gambling bot and web interface.
 """
+import time
+
+# Taken before anything heavy is imported, so the startup report covers imports too
+STARTED = time.perf_counter()
+
 import os
+import logging
 
-# Import the Flask app for gunicorn
-from app import app
+def __getattr__(name):
+    """
+    Import the Flask app only when it is asked for (gunicorn's main:app),
+    so running the bot never loads the web stack or touches the web database.
+    """
+    if name == "app":
+        from app import app
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def main():
     """
     Main entry point for the Discord gambling bot.
     """
+    logging.basicConfig(level=logging.INFO)
+    
     from bot import setup_bot
+    from utils.startup import StartupTimer
     
     # Get Discord bot token from environment variable
     token = os.environ.get("DISCORD_BOT_TOKEN")
@@ -18,9 +34,11 @@ def main():
         raise ValueError("DISCORD_BOT_TOKEN environment variable not set")
     
     # Create and run the bot
-    bot = setup_bot()
-    bot.run(token)
+    startup = StartupTimer(STARTED)
+    startup.mark("imports")
+    bot = setup_bot(startup)
+    bot.run(token, log_handler=None)  # Logging is configured above
 
 if __name__ == "__main__":
     # Only run the bot when this script is executed directly
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,168 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from utils.data_manager import DataManager, DataReader
+
+
+def test_transaction_with_tiny_cache_commits_every_user(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_BACKEND", "sqlite")
+    data_file = str(tmp_path / "user_data.json")
+
+    manager = DataManager(data_file, cache_size=1)
+    manager.get_user_data(1)
+    manager.get_user_data(2)
+    manager.get_user_data(3)  # Leaves only user 3 cached
+
+    with manager.transaction():
+        manager.update_balance(1, -100)
+        manager.update_balance(2, 100)
+
+    assert manager.get_user_data(1).balance == 400
+    assert manager.get_user_data(2).balance == 600
+    manager.close()
+
+    reopened = DataManager(data_file, cache_size=1)
+    assert reopened.get_user_data(1).balance == 400
+    assert reopened.get_user_data(2).balance == 600
+    reopened.close()
+
+
+def test_failed_transaction_rolls_back_with_tiny_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_BACKEND", "sqlite")
+    data_file = str(tmp_path / "user_data.json")
+
+    manager = DataManager(data_file, cache_size=1)
+    manager.get_user_data(1)
+    manager.get_user_data(2)
+
+    try:
+        with manager.transaction():
+            manager.update_balance(1, -100)
+            manager.update_balance(2, 100)
+            raise RuntimeError("bet failed")
+    except RuntimeError:
+        pass
+
+    assert manager.get_user_data(1).balance == 500
+    assert manager.get_user_data(2).balance == 500
+    manager.close()
+
+
+def test_index_built_in_background_keeps_commits_made_during_the_scan(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_BACKEND", "sqlite")
+    manager = DataManager(str(tmp_path / "user_data.json"), cache_size=1)
+    for user_id in (1, 2, 3):
+        manager.update_balance(user_id, user_id * 100)
+    manager.flush()
+
+    scanning = threading.Event()
+    scan = manager.store.balances
+
+    def slow_balances():
+        rows = list(scan())
+        scanning.set()
+        time.sleep(0.2)  # Commits land after the rows were read
+        return rows
+
+    manager.store.balances = slow_balances
+
+    async def run():
+        build = asyncio.ensure_future(manager.build_index())
+        while not scanning.is_set():
+            await asyncio.sleep(0.01)
+        # Committed mid-scan, then evicted from the cache before the build finishes
+        manager.update_balance(1, 1000)
+        manager.get_user_data(2)
+        manager.get_user_data(3)
+        await build
+
+    asyncio.run(run())
+
+    assert manager.rank(1) == 1
+    assert manager.top(1)[0][1].balance == 1600
+    assert manager.user_count() == 3
+    manager.close()
+
+
+def test_set_stat_replaces_highest_win(tmp_path, monkeypatch):
+    monkeypatch.delenv("DATA_BACKEND", raising=False)
+    manager = DataManager(str(tmp_path / "user_data.json"))
+
+    manager.set_stat(1, "highest_win", 100)
+    manager.set_stat(1, "highest_win", 300)
+    manager.update_stats(1, "slots_played", 2)
+
+    stats = manager.get_user_data(1)["stats"]
+    assert stats["highest_win"] == 300
+    assert stats["slots_played"] == 2
+    manager.close()
+
+
+def test_failed_transaction_writes_nothing_to_the_json_journal(tmp_path, monkeypatch):
+    monkeypatch.delenv("DATA_BACKEND", raising=False)
+    data_file = str(tmp_path / "user_data.json")
+    manager = DataManager(data_file)
+    manager.update_balance(1, 100)
+    manager.flush()
+    journal_before = open(f"{data_file}.journal", encoding="utf-8").read()
+
+    try:
+        with manager.transaction():
+            manager.update_balance(1, -600)
+            manager.update_balance(2, 600)
+            raise RuntimeError("bet failed")
+    except RuntimeError:
+        pass
+
+    assert manager.get_user_data(1).balance == 600
+    assert not manager.has_user(2)
+    manager.flush()
+    assert open(f"{data_file}.journal", encoding="utf-8").read() == journal_before
+    manager.close()
+
+    reopened = DataManager(data_file)
+    assert reopened.get_user_data(1).balance == 600
+    assert not reopened.has_user(2)
+    reopened.close()
+
+
+def test_reader_polls_changes_from_the_sqlite_owner(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_BACKEND", "sqlite")
+    data_file = str(tmp_path / "user_data.json")
+    manager = DataManager(data_file)
+    manager.update_balance(1, 100)
+    manager.flush()
+
+    reader = DataReader(data_file, refresh_interval=0)
+    assert reader.get_user_data(1).balance == 600
+
+    with manager.transaction():
+        manager.update_balance(1, -50)
+        manager.update_balance(2, 40)
+    manager.flush()
+
+    assert reader.get_user_data(1).balance == 550
+    assert reader.get_user_data(2).balance == 540
+    assert reader.rank(2) == 2
+    reader.close()
+    manager.close()
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_guild_settings_survive_a_restart(tmp_path, monkeypatch, backend):
+    monkeypatch.setenv("DATA_BACKEND", backend)
+    data_file = str(tmp_path / "user_data.json")
+    manager = DataManager(data_file)
+    manager.set_guild_setting(123, "instant_spin", True)
+    manager.set_guild_setting(456, "instant_spin", True)
+    manager.set_guild_setting(456, "instant_spin", False)
+    manager.close()
+
+    reopened = DataManager(data_file)
+    assert reopened.get_guild_setting(123, "instant_spin") is True
+    assert reopened.get_guild_setting(456, "instant_spin") is False
+    assert reopened.get_guild_setting(789, "instant_spin", "unset") == "unset"
+    reopened.close()
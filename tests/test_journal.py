@@ -0,0 +1,35 @@
+from utils.journal import Journal
+
+
+def test_replay_drops_torn_tail_and_appends_after_it(tmp_path):
+    path = tmp_path / "user_data.json.journal"
+    journal = Journal(str(path))
+    journal.append({"v": 1, "users": {"1": {"balance": 500}}})
+    journal.append({"v": 2, "users": {"1": {"balance": 400}}})
+    journal.close()
+
+    # A crash in the middle of writing the third entry
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"v": 3, "users": {"1": {"bal')
+
+    journal = Journal(str(path))
+    assert [entry["v"] for entry in journal.replay()] == [1, 2]
+    assert path.read_text(encoding="utf-8").endswith("}}}\n")
+
+    journal.append({"v": 3, "users": {"1": {"balance": 300}}})
+    journal.close()
+    assert [entry["v"] for entry in Journal(str(path)).replay()] == [1, 2, 3]
+
+
+def test_read_from_stops_at_incomplete_line(tmp_path):
+    path = tmp_path / "user_data.json.journal"
+    journal = Journal(str(path))
+    journal.append({"v": 1, "users": {}})
+    journal.close()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"v": 2')
+
+    entries, offset = Journal(str(path)).read_from(0)
+
+    assert entries == [{"v": 1, "users": {}}]
+    assert offset == len('{"v":1,"users":{}}\n')
@@ -0,0 +1,30 @@
+import random
+from collections import Counter
+
+from utils.locks import StripedLock
+
+DISCORD_EPOCH = 1420070400000
+
+
+def snowflake(timestamp_ms: int, worker: int = 1, process: int = 0, increment: int = 0) -> int:
+    return ((timestamp_ms - DISCORD_EPOCH) << 22) | (worker << 17) | (process << 12) | increment
+
+
+def test_snowflakes_spread_across_stripes():
+    rng = random.Random(0)
+    locks = StripedLock()
+    # Accounts created between 2016 and 2025, with the counter bits at 0 like most real IDs
+    ids = [snowflake(rng.randrange(1451606400000, 1735689600000), worker=rng.randrange(32)) for _ in range(2000)]
+
+    stripes = Counter(locks._stripe(user_id) for user_id in ids)
+
+    assert len(stripes) > 240
+    assert max(stripes.values()) < 25
+
+
+def test_stripe_is_in_range_and_stable():
+    locks = StripedLock(stripes=7)
+    for user_id in (0, 1, 80351110224678912, 1234567890123456789, 2 ** 64 - 1):
+        stripe = locks._stripe(user_id)
+        assert 0 <= stripe < 7
+        assert stripe == locks._stripe(user_id)
@@ -0,0 +1,20 @@
+import logging
+
+from utils.metrics import Metrics, RateLimitCounter
+
+
+def test_global_rate_limit_counts_once():
+    metrics = Metrics()
+    logger = logging.getLogger("test_metrics.discord.http")
+    logger.propagate = False
+    handler = RateLimitCounter(metrics)
+    logger.addHandler(handler)
+    try:
+        # What discord.py logs for one global 429
+        logger.warning("We are being rate limited. %s %s responded with 429. Retrying in %.2f seconds.",
+                       "POST", "https://discord.com/api/v10/channels/1/messages", 1.5)
+        logger.warning("Global rate limit has been hit. Retrying in %.2f seconds.", 1.5)
+    finally:
+        logger.removeHandler(handler)
+
+    assert metrics.rate_limit_hits == 1
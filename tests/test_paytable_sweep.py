@@ -0,0 +1,28 @@
+import pytest
+
+from utils.paytable_sweep import grid_candidates
+from utils.slot_machine import SlotMachine
+
+
+@pytest.mark.parametrize("spec, bad_key", [
+    ({"weights": {"🐸": [1, 2]}}, "🐸"),
+    ({"payouts": {"🐸": {"3": [10]}}}, "🐸"),
+    ({"payouts": {"7️⃣": {"4": [10]}}}, "'4'"),
+    ({"payouts": {"7️⃣": {"three": [10]}}}, "three"),
+    ({"weights": {"7️⃣": []}}, "7️⃣"),
+    ({"payout": {}}, "payout"),
+])
+def test_grid_spec_with_unknown_keys_is_rejected(spec, bad_key):
+    with pytest.raises(ValueError, match=bad_key):
+        list(grid_candidates(spec, SlotMachine()))
+
+
+def test_grid_spec_covers_every_combination():
+    base = SlotMachine()
+    spec = {"weights": {"7️⃣": [1, 2]}, "payouts": {"💎": {"2": [5, 10]}}}
+
+    candidates = list(grid_candidates(spec, base))
+
+    assert len(candidates) == 4
+    assert {(weights["7️⃣"], payouts["💎"][2]) for weights, payouts in candidates} == {(1, 5), (1, 10), (2, 5), (2, 10)}
+    assert all(payouts["7️⃣"] == base.PAYOUTS["7️⃣"] for _, payouts in candidates)
@@ -0,0 +1,110 @@
+import json
+
+from utils.storage import JSONBackend, SQLiteBackend
+
+
+def test_sqlite_round_trip(tmp_path):
+    db_file = str(tmp_path / "user_data.db")
+    backend = SQLiteBackend(db_file)
+    records = {
+        "1": {"balance": 750, "stats": {"slots_played": 3, "slots_won": 1, "highest_win": 250, "streak": 2},
+              "last_daily": 1700000000.5, "vote_bits": "6", "nickname": "high roller"},
+        "2": {"balance": 2 ** 70 + 1, "stats": {"slots_played": 0, "slots_won": 0}},
+    }
+    backend.write(records, 1)
+    backend.close()
+
+    data, version = SQLiteBackend(db_file).load()
+
+    assert version == 1
+    assert data == records
+    assert isinstance(data["2"]["balance"], int)
+
+
+def test_sqlite_reader_polls_new_rows(tmp_path):
+    db_file = str(tmp_path / "user_data.db")
+    writer = SQLiteBackend(db_file)
+    writer.write({"1": {"balance": 500, "stats": {}}}, 1)
+
+    reader = SQLiteBackend(db_file, read_only=True)
+    data, version = reader.load()
+    assert version == 1
+
+    writer.write({"1": {"balance": 400, "stats": {}}, "2": {"balance": 600, "stats": {}}}, 2)
+    changed, version = reader.poll(data)
+
+    assert changed == {"1", "2"}
+    assert version == 2
+    assert data["1"]["balance"] == 400 and data["2"]["balance"] == 600
+    assert reader.poll(data) == (set(), 2)
+
+
+def test_sqlite_commit_during_load_is_polled_later(tmp_path):
+    db_file = str(tmp_path / "user_data.db")
+    writer = SQLiteBackend(db_file)
+    writer.write({"1": {"balance": 500, "stats": {}}}, 1)
+
+    reader = SQLiteBackend(db_file, read_only=True)
+    statements = []
+
+    def commit_before_third_statement(sql):
+        # load() checks the schema, then reads the rows and the stored version
+        statements.append(sql)
+        if len(statements) == 3:
+            writer.write({"2": {"balance": 600, "stats": {}}}, 2)
+
+    reader.conn.set_trace_callback(commit_before_third_statement)
+    data, version = reader.load()
+    reader.conn.set_trace_callback(None)
+
+    reader.poll(data)
+    assert data.get("2") == {"balance": 600, "stats": {"slots_played": 0, "slots_won": 0}}
+
+
+def users(count, balance):
+    return {str(user_id): {"balance": balance, "stats": {}} for user_id in range(1, count + 1)}
+
+
+def read_json(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_json_compaction_merges_small_deltas_into_the_journal(tmp_path):
+    data_file = str(tmp_path / "user_data.json")
+    backend = JSONBackend(data_file, fold_ratio=0.25)
+    backend.load()
+    backend.write(users(10, 500), 1)
+    backend.compact(None, 1)  # Everything is new, so it is folded into the snapshot
+
+    backend.write({"1": {"balance": 400, "stats": {}}}, 2)
+    backend.write({"1": {"balance": 300, "stats": {}}}, 3)
+    backend.compact(None, 3)
+    backend.close()
+
+    # One changed user out of ten stays in the journal, merged into a single entry
+    assert read_json(data_file)["1"]["balance"] == 500
+    assert [line for line in open(f"{data_file}.journal", encoding="utf-8")] == [
+        '{"base":1}\n', '{"v":3,"users":{"1":{"balance":300,"stats":{}}}}\n'
+    ]
+    data, version = JSONBackend(data_file).load()
+    assert version == 3
+    assert data["1"]["balance"] == 300 and data["2"]["balance"] == 500
+
+
+def test_json_compaction_folds_large_deltas_into_the_snapshot(tmp_path):
+    data_file = str(tmp_path / "user_data.json")
+    backend = JSONBackend(data_file, fold_ratio=0.25)
+    backend.load()
+    backend.write(users(10, 500), 1)
+    backend.compact(None, 1)
+
+    backend.write(users(5, 100), 2)
+    backend.compact(None, 2)
+    backend.close()
+
+    snapshot = read_json(data_file)
+    assert len(snapshot) == 10
+    assert snapshot["5"]["balance"] == 100 and snapshot["6"]["balance"] == 500
+    assert open(f"{data_file}.journal", encoding="utf-8").read() == '{"base":2}\n'
+    assert JSONBackend(data_file).load() == (snapshot, 2)
@@ -0,0 +1,44 @@
+import json
+
+import pytest
+
+from utils.data_manager import DataManager
+from utils.user_record import UserRecord, MAX_VOTE_NUMBER
+
+
+def test_legacy_votes_past_the_limit_stay_a_list():
+    record = UserRecord.from_dict({"balance": 123456, "claimed_votes": [1, 21, 10 ** 8, 10 ** 18]})
+
+    assert record.has_vote(21)
+    assert record.has_vote(10 ** 18)
+    assert not record.has_vote(22)
+    assert record.votes.bit_length() <= MAX_VOTE_NUMBER + 1
+
+    stored = record.to_dict()
+    assert len(json.dumps(stored)) < 200
+    assert UserRecord.from_dict(stored) == record
+    assert sorted(record["claimed_votes"]) == [1, 21, 10 ** 8, 10 ** 18]
+
+
+def test_oversized_vote_bitmap_is_trimmed():
+    record = UserRecord.from_dict({"balance": 1, "vote_bits": format((1 << 5) | (1 << 20_000), "x")})
+
+    assert record.has_vote(5)
+    assert record.has_vote(20_000)
+    assert record.votes == 1 << 5
+
+
+def test_add_vote_rejects_numbers_past_the_limit():
+    record = UserRecord(balance=0)
+    with pytest.raises(ValueError):
+        record.add_vote(MAX_VOTE_NUMBER + 1)
+
+
+def test_unreadable_data_stops_startup(tmp_path, monkeypatch):
+    monkeypatch.delenv("DATA_BACKEND", raising=False)
+    data_file = tmp_path / "user_data.json"
+    data_file.write_text("{not json")
+
+    with pytest.raises(ValueError):
+        DataManager(str(data_file))
+    assert data_file.read_text() == "{not json"
@@ -0,0 +1,66 @@
+import asyncio
+import threading
+import time
+
+from utils.storage import JSONBackend, StorageBackend
+from utils.writer import BackgroundWriter
+
+
+def test_idle_writer_syncs_journal_within_interval(tmp_path):
+    backend = JSONBackend(str(tmp_path / "user_data.json"), sync_every=1000, sync_interval=0.05)
+    backend.load()
+    writer = BackgroundWriter(backend)
+    try:
+        # Fewer entries than sync_every, and nothing written afterwards
+        writer.submit({"1": {"balance": 500}}, 1)
+        writer.submit({"2": {"balance": 500}}, 2)
+
+        deadline = time.monotonic() + 2
+        while writer.stats()["batches"] == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert writer.stats()["batches"] >= 1
+
+        while backend.sync_deadline() is not None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert backend.sync_deadline() is None
+    finally:
+        writer.close()
+
+
+class StuckBackend(StorageBackend):
+    """Backend whose writes hang until released, like a stalled disk."""
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def write(self, records, version):
+        self.release.wait()
+
+
+def test_full_queue_waits_without_blocking_the_loop():
+    backend = StuckBackend()
+    writer = BackgroundWriter(backend, max_pending=2)
+
+    async def run():
+        writer.submit({"1": {"balance": 1}}, 1)
+        while writer.stats()["queue_depth"]:
+            await asyncio.sleep(0.01)  # The thread has taken it and is stuck writing
+        writer.submit({"2": {"balance": 1}, "3": {"balance": 1}}, 2)
+
+        waiting = asyncio.ensure_future(writer.wait_for_space())
+        ticks = 0
+        for _ in range(10):
+            await asyncio.sleep(0.01)
+            ticks += 1
+        assert not waiting.done()
+        assert ticks == 10
+
+        backend.release.set()
+        await asyncio.wait_for(waiting, 2)
+
+    try:
+        asyncio.run(run())
+        assert writer.stats()["stalls"] == 1
+    finally:
+        backend.release.set()
+        writer.close()
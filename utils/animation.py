@@ -0,0 +1,194 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Deque, Dict, Any, Iterable, List, Optional, Set
+import discord
+
+logger = logging.getLogger(__name__)
+
+class ChannelBudget:
+    """
+    Estimate of the REST calls spent against one channel's rate limit bucket.
+
+    Discord limits message sends and edits per channel, so every call made in
+    the channel is remembered for one window and the calls left are whatever
+    the limit allows on top of those.
+    """
+
+    def __init__(self, limit: int, window: float):
+        """
+        Create an empty budget.
+
+        Args:
+            limit (int): Calls allowed per window
+            window (float): Length of the window in seconds
+        """
+        self.limit = limit
+        self.window = window
+        self.calls: Deque[float] = deque()
+        self.active = 0  # Animations playing in the channel, each still owing a final call
+
+    def remaining(self, now: float) -> int:
+        """Get the number of calls left in the current window."""
+        while self.calls and now - self.calls[0] >= self.window:
+            self.calls.popleft()
+        return self.limit - len(self.calls)
+
+    def has_room(self, now: float) -> bool:
+        """
+        Check whether an optional call fits in the window, keeping one call
+        in reserve for the final result of every animation in the channel.
+        """
+        return self.remaining(now) > self.active
+
+    def spend(self, now: float) -> None:
+        """Record a call made in the channel."""
+        self.calls.append(now)
+
+class AnimationScheduler:
+    """
+    Plays spin animations while keeping each channel under its rate limit.
+
+    An animation is a list of frames followed by a final result. The first
+    frame is sent as a new message and later frames are edits to it, shown
+    one interval apart. Frames that are cosmetic get dropped when they would
+    not leave room for the final results of every animation playing in the
+    same channel, or when a slow edit has already made the next frame due,
+    so a busy channel costs about one call per spin instead of one per frame.
+    Guilds in instant mode skip the animation and get the result straight away.
+    """
+
+    def __init__(self, interval: float = 0.5, limit: int = 5, window: float = 5.0,
+                 instant_guilds: Optional[Iterable[int]] = None, max_channels: int = 1_000):
+        """
+        Create a scheduler.
+
+        Args:
+            interval (float): Seconds between frames
+            limit (int): Calls allowed per channel per window, matching Discord's message bucket
+            window (float): Length of the rate limit window in seconds
+            instant_guilds (Optional[Iterable[int]]): Guilds that skip animations, defaults to the
+                comma-separated IDs in the INSTANT_SPIN_GUILDS environment variable
+            max_channels (int): Channels to track before idle ones are forgotten
+        """
+        self.interval = interval
+        self.limit = limit
+        self.window = window
+        self.max_channels = max_channels
+
+        if instant_guilds is None:
+            instant_guilds = (int(guild_id) for guild_id in os.environ.get("INSTANT_SPIN_GUILDS", "").split(",") if guild_id.strip())
+        self.instant_guilds: Set[int] = set(instant_guilds)
+
+        self._channels: Dict[int, ChannelBudget] = {}
+        self._stats = {
+            "animations": 0,
+            "calls": 0,  # Sends and edits made
+            "calls_saved": 0,  # Calls a full animation would have made on top of those
+            "instant": 0,  # Animations skipped for instant mode
+            "throttled": 0,  # Frames dropped to stay under a channel's limit
+            "late": 0,  # Frames dropped because a newer frame was already due
+        }
+
+    def is_instant(self, guild_id: Optional[int]) -> bool:
+        """Check whether a guild skips animations."""
+        return guild_id in self.instant_guilds
+
+    def set_instant(self, guild_id: int, enabled: bool) -> None:
+        """
+        Turn instant mode on or off for a guild.
+
+        Args:
+            guild_id (int): Discord guild ID
+            enabled (bool): Whether the guild should skip animations
+        """
+        if enabled:
+            self.instant_guilds.add(guild_id)
+        else:
+            self.instant_guilds.discard(guild_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get counters describing the calls made and saved.
+
+        Returns:
+            Dict[str, Any]: Counters since start, plus the number of channels tracked
+        """
+        stats = dict(self._stats)
+        stats["channels"] = len(self._channels)
+        return stats
+
+    def _budget(self, channel_id: int, now: float) -> ChannelBudget:
+        """Get the budget of a channel, forgetting idle channels when there are too many."""
+        budget = self._channels.get(channel_id)
+        if budget is None:
+            if len(self._channels) >= self.max_channels:
+                for idle_id in [key for key, value in self._channels.items() if not value.active and value.remaining(now) == value.limit]:
+                    del self._channels[idle_id]
+            budget = self._channels[channel_id] = ChannelBudget(self.limit, self.window)
+        return budget
+
+    async def play(self, channel: discord.abc.Messageable, frames: List[discord.Embed], final: discord.Embed) -> discord.Message:
+        """
+        Show an animation in a channel, ending on the final result.
+
+        Args:
+            channel (discord.abc.Messageable): Channel to send the animation to
+            frames (List[discord.Embed]): Frames to show in order before the result
+            final (discord.Embed): Result to end on; always shown
+
+        Returns:
+            discord.Message: The message showing the result
+        """
+        loop = asyncio.get_running_loop()
+        guild = getattr(channel, "guild", None)
+        budget = self._budget(channel.id, time.monotonic())
+        full_cost = len(frames) + 1 if frames else 1
+        calls = 0
+
+        budget.active += 1
+        try:
+            skip = not frames
+            if not skip and self.is_instant(guild.id if guild else None):
+                self._stats["instant"] += 1
+                skip = True
+            elif not skip and not budget.has_room(time.monotonic()):
+                self._stats["throttled"] += len(frames)
+                skip = True
+
+            if skip:
+                budget.spend(time.monotonic())
+                calls += 1
+                return await channel.send(embed=final)
+
+            start = loop.time()
+            budget.spend(time.monotonic())
+            calls += 1
+            message = await channel.send(embed=frames[0])
+
+            for index in range(1, len(frames)):
+                delay = start + index * self.interval - loop.time()
+                if delay <= -self.interval:
+                    self._stats["late"] += 1  # The frame after this one is already due
+                    continue
+                await asyncio.sleep(max(delay, 0))
+
+                if not budget.has_room(time.monotonic()):
+                    self._stats["throttled"] += 1
+                    continue
+                budget.spend(time.monotonic())
+                calls += 1
+                await message.edit(embed=frames[index])
+
+            await asyncio.sleep(max(start + len(frames) * self.interval - loop.time(), 0))
+            budget.spend(time.monotonic())
+            calls += 1
+            await message.edit(embed=final)
+            return message
+        finally:
+            budget.active -= 1
+            self._stats["animations"] += 1
+            self._stats["calls"] += calls
+            self._stats["calls_saved"] += max(full_cost - calls, 0)
@@ -0,0 +1,268 @@
+import heapq
+from bisect import bisect_left, insort
+from typing import Dict, List, Tuple, Iterator, Optional, Set, Union
+
+Balance = Union[int, float]
+
+class FenwickTree:
+    """Prefix sums over a list of counts with O(log n) updates and queries."""
+
+    def __init__(self, counts: List[int]):
+        """
+        Build the tree in O(n).
+
+        Args:
+            counts (List[int]): Initial counts
+        """
+        self._tree = [0] + list(counts)
+        for i in range(1, len(self._tree)):
+            parent = i + (i & -i)
+            if parent < len(self._tree):
+                self._tree[parent] += self._tree[i]
+
+    def add(self, index: int, delta: int) -> None:
+        """Add delta to the count at index (0-based)."""
+        i = index + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def prefix(self, index: int) -> int:
+        """Sum of the counts before index (0-based)."""
+        total = 0
+        i = index
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def find(self, position: int) -> Tuple[int, int]:
+        """
+        Locate the item at a position in the concatenation of all counts.
+
+        Args:
+            position (int): 0-based position, less than the total count
+
+        Returns:
+            Tuple[int, int]: Index of the count containing it, and the offset within that count
+        """
+        index = 0
+        step = 1 << (len(self._tree).bit_length() - 1)
+        while step:
+            nxt = index + step
+            if nxt < len(self._tree) and self._tree[nxt] <= position:
+                index = nxt
+                position -= self._tree[nxt]
+            step >>= 1
+        return index, position
+
+class BalanceIndex:
+    """
+    Users ordered by balance, highest first, kept sorted as balances change.
+
+    Entries are stored as (-balance, user_id) keys in a list of small sorted
+    buckets, so an update only shifts one bucket instead of the whole list,
+    and the top of the leaderboard is a slice of the first buckets. A Fenwick
+    tree over the bucket sizes turns positions into buckets and back in
+    O(log n), which makes rank and range queries logarithmic as well.
+    """
+
+    def __init__(self, balances: Optional[Dict[int, Balance]] = None, bucket_size: int = 1000):
+        """
+        Build the index.
+
+        Args:
+            balances (Optional[Dict[int, Balance]]): Initial balances by user ID
+            bucket_size (int): Target number of entries per bucket
+        """
+        self.bucket_size = bucket_size
+        self._balances: Dict[int, Balance] = {}
+        self._buckets: List[List[Tuple[Balance, int]]] = []
+        self._maxes: List[Tuple[Balance, int]] = []  # Last key of each bucket
+        self._sizes = FenwickTree([])  # Number of keys in each bucket
+        if balances:
+            self.rebuild(balances)
+
+    def __len__(self) -> int:
+        return len(self._balances)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._balances
+
+    def rebuild(self, balances: Dict[int, Balance]) -> None:
+        """
+        Replace the contents of the index with a sort of the given balances.
+
+        Args:
+            balances (Dict[int, Balance]): Balances by user ID
+        """
+        self._balances = dict(balances)
+        keys = sorted((-balance, user_id) for user_id, balance in self._balances.items())
+        self._buckets = [keys[i:i + self.bucket_size] for i in range(0, len(keys), self.bucket_size)]
+        self._maxes = [bucket[-1] for bucket in self._buckets]
+        self._sizes = FenwickTree([len(bucket) for bucket in self._buckets])
+
+    def set(self, user_id: int, balance: Balance) -> None:
+        """
+        Insert a user or move them to their new balance.
+
+        Args:
+            user_id (int): Discord user ID
+            balance (Balance): The user's current balance
+        """
+        old = self._balances.get(user_id)
+        if old == balance:
+            return
+        if old is not None:
+            self._remove((-old, user_id))
+        self._balances[user_id] = balance
+        self._insert((-balance, user_id))
+
+    def discard(self, user_id: int) -> None:
+        """
+        Remove a user from the index if present.
+
+        Args:
+            user_id (int): Discord user ID
+        """
+        old = self._balances.pop(user_id, None)
+        if old is not None:
+            self._remove((-old, user_id))
+
+    def _insert(self, key: Tuple[Balance, int]) -> None:
+        if not self._buckets:
+            self._buckets.append([key])
+            self._maxes.append(key)
+            self._sizes = FenwickTree([1])
+            return
+
+        pos = min(bisect_left(self._maxes, key), len(self._buckets) - 1)
+        bucket = self._buckets[pos]
+        insort(bucket, key)
+        self._maxes[pos] = bucket[-1]
+        self._sizes.add(pos, 1)
+
+        # Split buckets that grew too large to keep inserts cheap; this shifts
+        # bucket positions, so the size tree is rebuilt (once per bucket_size inserts)
+        if len(bucket) > 2 * self.bucket_size:
+            half = len(bucket) // 2
+            self._buckets[pos:pos + 1] = [bucket[:half], bucket[half:]]
+            self._maxes[pos:pos + 1] = [bucket[half - 1], bucket[-1]]
+            self._sizes = FenwickTree([len(b) for b in self._buckets])
+
+    def _remove(self, key: Tuple[Balance, int]) -> None:
+        pos = bisect_left(self._maxes, key)
+        bucket = self._buckets[pos]
+        del bucket[bisect_left(bucket, key)]
+
+        if bucket:
+            self._maxes[pos] = bucket[-1]
+            self._sizes.add(pos, -1)
+        else:
+            del self._buckets[pos]
+            del self._maxes[pos]
+            self._sizes = FenwickTree([len(b) for b in self._buckets])
+
+    def __iter__(self) -> Iterator[Tuple[int, Balance]]:
+        """Iterate over (user_id, balance) pairs from richest to poorest."""
+        for bucket in self._buckets:
+            for neg_balance, user_id in bucket:
+                yield user_id, -neg_balance
+
+    def slice(self, start: int, stop: int) -> List[Tuple[int, Balance]]:
+        """
+        Get the users at the given leaderboard positions.
+
+        Args:
+            start (int): First position, 0-based
+            stop (int): Position after the last one
+
+        Returns:
+            List[Tuple[int, Balance]]: (user_id, balance) pairs, richest first
+        """
+        result = []
+        stop = min(stop, len(self._balances))
+        if start >= stop:
+            return result
+
+        pos, offset = self._sizes.find(start)
+        while len(result) < stop - start and pos < len(self._buckets):
+            for neg_balance, user_id in self._buckets[pos][offset:offset + stop - start - len(result)]:
+                result.append((user_id, -neg_balance))
+            pos += 1
+            offset = 0
+        return result
+
+    def top(self, k: int) -> List[Tuple[int, Balance]]:
+        """
+        Get the k richest users.
+
+        Args:
+            k (int): Number of users
+
+        Returns:
+            List[Tuple[int, Balance]]: (user_id, balance) pairs, richest first
+        """
+        return self.slice(0, k)
+
+    def top_members(self, member_ids: Set[int], k: int) -> List[Tuple[int, Balance]]:
+        """
+        Get the k richest users out of a set, e.g. the members of a guild.
+
+        Small sets are ranked directly from their members' balances; large sets
+        walk the index from the top and stop as soon as k members are found.
+
+        Args:
+            member_ids (Set[int]): User IDs to consider
+            k (int): Number of users
+
+        Returns:
+            List[Tuple[int, Balance]]: (user_id, balance) pairs, richest first
+        """
+        result = []
+        if k <= 0:
+            return result
+
+        if len(member_ids) * 4 < len(self._balances):
+            keys = ((-self._balances[user_id], user_id) for user_id in member_ids if user_id in self._balances)
+            return [(user_id, -neg_balance) for neg_balance, user_id in heapq.nsmallest(k, keys)]
+
+        for user_id, balance in self:
+            if user_id in member_ids:
+                result.append((user_id, balance))
+                if len(result) >= k:
+                    break
+        return result
+
+    def rank(self, user_id: int) -> Optional[int]:
+        """
+        Get a user's leaderboard position.
+
+        Args:
+            user_id (int): Discord user ID
+
+        Returns:
+            Optional[int]: 1-based position, or None if the user isn't indexed
+        """
+        balance = self._balances.get(user_id)
+        if balance is None:
+            return None
+
+        key = (-balance, user_id)
+        pos = bisect_left(self._maxes, key)
+        return self._sizes.prefix(pos) + bisect_left(self._buckets[pos], key) + 1
+
+    def percentile(self, user_id: int) -> Optional[float]:
+        """
+        Get the share of users ranked below a user.
+
+        Args:
+            user_id (int): Discord user ID
+
+        Returns:
+            Optional[float]: Percentage of users the user is richer than, or None if the user isn't indexed
+        """
+        rank = self.rank(user_id)
+        if rank is None:
+            return None
+        return 100.0 * (len(self._balances) - rank) / len(self._balances)
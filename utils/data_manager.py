@@ -1,141 +1,825 @@
-import json
 import os
-import logging
-from typing import Dict, Any, Optional, Union
+import time
 import asyncio
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager, asynccontextmanager
+from typing import Dict, Any, Optional, Union, List, Set, Tuple, Callable, Iterator, AsyncIterator
+from utils.storage import StorageBackend, create_backend
+from utils.locks import StripedLock
+from utils.balance_index import BalanceIndex
+from utils.writer import BackgroundWriter
+from utils.user_record import UserRecord
+from utils.lru_cache import LRUCache
+from utils.metrics import timed, span
 
 logger = logging.getLogger(__name__)
 
+UserId = Union[str, int]  # Discord user IDs are accepted as either; records are keyed by int
+
 class DataManager:
     """
-    Handles data persistence for the gambling bot, storing user data in a JSON file.
+    Handles data persistence for the gambling bot, keeping user data in memory
+    and persisting changes through a StorageBackend.
+    
+    By default this is a JSON snapshot with an append-only journal of changes;
+    set DATA_BACKEND=sqlite to use a SQLite database instead.
+    
+    Each user is held as a compact UserRecord keyed by integer user ID. The
+    public methods accept IDs as strings or integers and return integer IDs.
+    
+    Normally every user is loaded at startup. With DATA_CACHE_SIZE set and a
+    backend that supports point lookups (SQLite), users are instead paged in
+    on first use and kept in an LRU cache of that size, and the balance index
+    is only built when a leaderboard is first asked for. Every commit is
+    already queued for writing, so evicting a user needs no extra write.
+    
+    One DataManager per process owns the data; use get_data_manager()
+    instead of constructing new instances, and DataReader in processes that
+    only need to read.
     """
     
-    def __init__(self, data_file: str = "user_data.json"):
+    def __init__(self, data_file: str = "user_data.json", backend: Optional[StorageBackend] = None,
+                 cache_size: Optional[int] = None):
         """
         Initialize the DataManager with the specified data file.
         
         Args:
             data_file (str): Name of the JSON file to store data
+            backend (Optional[StorageBackend]): Backend to use instead of the one selected by DATA_BACKEND
+            cache_size (Optional[int]): Users to keep in memory when loading on demand;
+                defaults to DATA_CACHE_SIZE, and 0 loads everyone at startup
         """
         self.data_file = data_file
-        self.data = {}
+        self.data: Dict[int, UserRecord] = {}
+        self.cache_size = int(os.environ.get("DATA_CACHE_SIZE", "0")) if cache_size is None else cache_size
+        self.store: Optional[StorageBackend] = None  # Source of on-demand loads, None when fully loaded
+        self.writer: Optional[BackgroundWriter] = None
         self.default_balance = 500  # Starting balance for new users
-        self.lock = asyncio.Lock()  # Lock for thread-safe file operations
+        self.locks = StripedLock()  # Per-user locks for read-modify-write sections
+        self.backend = backend or self._create_backend()
+        self.version = 0  # Incremented on every committed mutation
+        self.updated_at = time.time()  # Wall-clock time of the latest committed change
+        self.balance_index = BalanceIndex()  # Users sorted by balance, updated on every commit
+        self._index_ready = True  # False until the index is built when loading on demand
+        self._index_build: Optional[asyncio.Task] = None  # Background build started by build_index()
+        self._index_changes: Optional[Dict[int, Any]] = None  # Balances committed while it runs
+        self._subscribers: List[Callable[[Set[int], int], None]] = []
+        self.guild_settings: Dict[int, Dict[str, Any]] = {}  # Per-guild settings, e.g. instant spins
+        
+        # Open transaction of the current task: user ID -> record before the transaction
+        self._transaction = contextvars.ContextVar(f"transaction_{id(self)}", default=None)
         
-        # Load data from file, create if doesn't exist
+        # Load data from the backend, create if doesn't exist
         self._load_data()
+        
+        # From here on the backend is only written from the writer's thread
+        self.writer = self._create_writer()
+    
+    def _create_backend(self) -> StorageBackend:
+        return create_backend(self.data_file)
+    
+    def _create_writer(self) -> Optional[BackgroundWriter]:
+        return BackgroundWriter(self.backend)
+    
+    def _create_store(self) -> StorageBackend:
+        # A separate read-only connection, since the backend belongs to the writer's thread
+        return self.backend.open_reader()
     
     def _load_data(self) -> None:
-        """Load data from the JSON file, creating it if it doesn't exist."""
+        """Load all user data from the backend, or prepare to load users on demand."""
         try:
-            if os.path.exists(self.data_file):
-                with open(self.data_file, 'r') as f:
-                    self.data = json.load(f)
-                logger.info(f"Loaded data for {len(self.data)} users")
-            else:
-                self.data = {}
-                self._save_data()  # Create empty file
-                logger.info(f"Created new data file: {self.data_file}")
+            self.guild_settings = {int(guild_id): settings for guild_id, settings in self.backend.load_guild_settings().items()}
+        except Exception as e:
+            logger.error(f"Error loading guild settings: {str(e)}")
+            raise
+        
+        if self.cache_size > 0:
+            if self.backend.lookups:
+                self._open_store()
+                return
+            logger.warning(f"{type(self.backend).__name__} can't load single users, loading everyone instead")
+        
+        try:
+            stored, self.version = self.backend.load()
+            self.data = {int(user_id): UserRecord.from_dict(user_data) for user_id, user_data in stored.items()}
+            del stored
         except Exception as e:
+            # Carrying on with no users would overwrite everyone with new accounts on the next write
             logger.error(f"Error loading data: {str(e)}")
-            self.data = {}
+            raise
+        
+        self._rebuild_index()
+    
+    def _open_store(self) -> None:
+        """Start with an empty cache and load users from the backend as they're needed."""
+        try:
+            self.store = self._create_store()
+            self.version = self.store.current_version()
+        except Exception as e:
+            logger.error(f"Error opening data store: {str(e)}")
+            raise
+        self.data = LRUCache(self.cache_size)
+        self._index_ready = False
+        logger.info(f"Loading users on demand, keeping up to {self.cache_size} in memory")
+    
+    def _rebuild_index(self) -> None:
+        """Sort all users into the balance index."""
+        self.balance_index.rebuild({user_id: record.balance for user_id, record in self.data.items()})
+    
+    def _scan_balances(self) -> Dict[int, Any]:
+        """
+        Read every user's balance from the store, with writes still queued on top.
+        
+        Only touches the store and the writer, so it can run on a worker thread.
+        
+        Returns:
+            Dict[int, Any]: Balance by user ID
+        """
+        # Taken before the scan, so a batch written during the scan is in one or the other
+        pending = self.writer.pending_records() if self.writer is not None else {}
+        balances = {int(user_id): balance for user_id, balance in self.store.balances()}
+        for user_id, stored in pending.items():
+            balances[int(user_id)] = stored["balance"]
+        return balances
+    
+    def _finish_index(self, balances: Dict[int, Any], started: float) -> None:
+        """Load scanned balances into the index and start keeping it up to date."""
+        self.balance_index.rebuild(balances)
+        self._index_ready = True
+        logger.info(f"Built balance index of {len(balances)} users in {time.monotonic() - started:.2f}s")
+    
+    async def build_index(self) -> None:
+        """
+        Build the balance index on a worker thread when users are loaded on demand.
+        
+        Await this before the leaderboard methods on the event loop; they
+        would otherwise scan every stored balance on the loop. Concurrent
+        callers share one build.
+        """
+        if self._index_ready:
+            return
+        if self._index_build is None or self._index_build.done():
+            self._index_build = asyncio.ensure_future(self._build_index())
+        await asyncio.shield(self._index_build)
+    
+    async def _build_index(self) -> None:
+        started = time.monotonic()
+        
+        # Commits made during the scan are newer than anything it reads
+        self._index_changes = {}
+        try:
+            balances = await asyncio.to_thread(self._scan_balances)
+            if self._index_ready:
+                return  # Built synchronously in the meantime
+            balances.update(self._index_changes)
+        finally:
+            self._index_changes = None
+        self._finish_index(balances, started)
+    
+    def _ensure_index(self) -> None:
+        """Build the balance index on first use when users are loaded on demand."""
+        if self._index_ready:
+            return
+        
+        started = time.monotonic()
+        balances = self._scan_balances()
+        if self._index_changes is not None:
+            balances.update(self._index_changes)  # A background build is running; this one wins
+        self._finish_index(balances, started)
+    
+    def _lookup(self, user_id: int) -> Optional[UserRecord]:
+        """
+        Get a user's record, loading it from the backend if it isn't in memory.
+        
+        Args:
+            user_id (int): Discord user ID
+            
+        Returns:
+            Optional[UserRecord]: The record, or None for unknown users
+        """
+        record = self.data.get(user_id)
+        if record is not None or self.store is None:
+            return record
+        
+        # A queued write is newer than what the store has
+        stored = self.writer.pending_record(str(user_id)) if self.writer is not None else None
+        if stored is None:
+            stored = self.store.get(str(user_id))
+        if stored is None:
+            return None
+        
+        record = UserRecord.from_dict(stored)
+        self.data[user_id] = record
+        return record
     
     def _save_data(self) -> None:
-        """Save data to the JSON file."""
+        """Compact the backend, e.g. merge the JSON journal or fold it into the snapshot."""
         try:
-            with open(self.data_file, 'w') as f:
-                json.dump(self.data, f, indent=2)
-            logger.debug("Data saved successfully")
+            # Everything has been written by now, so the backend compacts from what it
+            # has stored and in-memory records never need converting back
+            self.backend.compact(None, self.version)
         except Exception as e:
             logger.error(f"Error saving data: {str(e)}")
     
-    def get_user_data(self, user_id: str) -> Dict[str, Any]:
+    @asynccontextmanager
+    async def lock_users(self, *user_ids: UserId) -> AsyncIterator[None]:
+        """
+        Lock users for a read-modify-write section that spans awaits.
+        
+        Hold this from checking a balance until the change is committed, so
+        concurrent commands for the same user cannot both spend the same coins.
+        While the writer is behind, this first waits for it to catch up; the
+        commit itself never blocks the event loop.
+        
+        Args:
+            *user_ids (UserId): IDs of all users the section reads or changes
+        """
+        if self.writer is not None:
+            await self.writer.wait_for_space()
+        async with self.locks.acquire(*(int(user_id) for user_id in user_ids)):
+            yield
+    
+    @contextmanager
+    def transaction(self) -> Iterator["DataManager"]:
+        """
+        Group all mutations made inside the block into a single atomic commit.
+        
+        Everything is persisted with one backend write when the block exits.
+        If the block raises, the in-memory records are restored and nothing is
+        written. Transactions belong to the asyncio task that opened them, and
+        a transaction opened inside another one joins the outer transaction.
+        
+        Yields:
+            DataManager: This data manager
+        """
+        if self._transaction.get() is not None:
+            yield self
+            return
+        
+        staged: Dict[int, Optional[UserRecord]] = {}
+        token = self._transaction.set(staged)
+        try:
+            try:
+                yield self
+            finally:
+                self._transaction.reset(token)
+            
+            if staged:
+                self._record(*staged)
+        except BaseException:
+            for user_id, before in staged.items():
+                if before is None:
+                    self.data.pop(user_id, None)
+                    if self._index_ready:
+                        self.balance_index.discard(user_id)
+                    elif self._index_changes is not None:
+                        self._index_changes.pop(user_id, None)
+                else:
+                    # Restore in place so references handed out earlier stay valid
+                    self.data[user_id].restore(before)
+                    if self._index_ready:
+                        self.balance_index.set(user_id, before.balance)
+                    elif self._index_changes is not None:
+                        self._index_changes[user_id] = before.balance
+            raise
+        finally:
+            if isinstance(self.data, LRUCache):
+                for user_id in staged:
+                    self.data.unpin(user_id)
+    
+    def _stage(self, user_id: int) -> None:
+        """
+        Remember a user's record before it is first changed in the current transaction.
+        
+        Args:
+            user_id (int): Discord user ID
+        """
+        staged = self._transaction.get()
+        if staged is not None and user_id not in staged:
+            # Keep the record in memory until the transaction ends, pinned
+            # before it is loaded so loading it can't evict it again
+            if isinstance(self.data, LRUCache):
+                self.data.pin(user_id)
+            
+            before = self._lookup(user_id)
+            staged[user_id] = before.copy() if before is not None else None
+    
+    @timed("data")
+    def _record(self, *user_ids: int) -> None:
+        """
+        Commit mutations that have already been applied in memory and queue them for writing.
+        
+        Inside a transaction this is deferred until the transaction commits.
+        
+        Args:
+            *user_ids (int): IDs of the users whose records changed
+        """
+        if self._transaction.get() is not None:
+            return
+        
+        if self._index_ready:
+            for user_id in user_ids:
+                self.balance_index.set(user_id, self.data[user_id].balance)
+        elif self._index_changes is not None:
+            for user_id in user_ids:
+                self._index_changes[user_id] = self.data[user_id].balance
+        
+        # The writer serializes records later on its own thread, so it gets
+        # independent copies in the storage format
+        self.version += 1
+        with span("data:serialize"):
+            records = {str(user_id): self.data[user_id].to_dict() for user_id in user_ids}
+        self.writer.submit(records, self.version)
+        
+        self._notify(set(user_ids))
+    
+    def _notify(self, changed: Set[int]) -> None:
+        """Call every subscriber with the users changed by the latest commit."""
+        self.updated_at = time.time()
+        for callback in self._subscribers:
+            try:
+                callback(changed, self.version)
+            except Exception as e:
+                logger.error(f"Error in data change subscriber: {str(e)}")
+    
+    def subscribe(self, callback: Callable[[Set[int], int], None]) -> None:
+        """
+        Register a callback that is notified after every committed change.
+        
+        Args:
+            callback (Callable[[Set[int], int], None]): Called with the changed user IDs and the new version
+        """
+        self._subscribers.append(callback)
+    
+    def unsubscribe(self, callback: Callable[[Set[int], int], None]) -> None:
+        """
+        Stop notifying a callback registered with subscribe().
+        
+        Args:
+            callback (Callable[[Set[int], int], None]): The registered callback
+        """
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+    
+    def get_guild_setting(self, guild_id: int, key: str, default: Any = None) -> Any:
+        """
+        Get a setting of a guild.
+        
+        Args:
+            guild_id (int): Discord guild ID
+            key (str): Name of the setting
+            default (Any): Value if the guild hasn't set it
+            
+        Returns:
+            Any: The setting's value
+        """
+        return self.guild_settings.get(int(guild_id), {}).get(key, default)
+    
+    def set_guild_setting(self, guild_id: int, key: str, value: Any) -> None:
+        """
+        Change a setting of a guild and queue it for writing.
+        
+        Args:
+            guild_id (int): Discord guild ID
+            key (str): Name of the setting
+            value (Any): JSON-serializable value
+        """
+        self.guild_settings.setdefault(int(guild_id), {})[key] = value
+        
+        # Settings are few and small, so the writer replaces all of them
+        self.writer.submit_guild_settings(
+            {str(guild_id): dict(settings) for guild_id, settings in self.guild_settings.items()}
+        )
+    
+    def _new_user(self) -> UserRecord:
+        """Build the record for a new user."""
+        return UserRecord(balance=self.default_balance)
+    
+    def flush(self) -> None:
+        """Wait until all committed mutations are written and synced to disk."""
+        self.writer.flush()
+    
+    def write_stats(self) -> Dict[str, Any]:
+        """
+        Get the background writer's throughput and backpressure counters.
+        
+        Returns:
+            Dict[str, Any]: Counters such as batches, coalesced records, queue depth and stall time
+        """
+        return self.writer.stats()
+    
+    def cache_stats(self) -> Dict[str, int]:
+        """
+        Get hit and eviction counters of the user cache when loading on demand.
+        
+        Returns:
+            Dict[str, int]: Cached users, capacity, hits, misses and evictions; empty when fully loaded
+        """
+        if not isinstance(self.data, LRUCache):
+            return {}
+        return {
+            "cached": len(self.data),
+            "capacity": self.data.capacity,
+            "hits": self.data.hits,
+            "misses": self.data.misses,
+            "evictions": self.data.evictions
+        }
+    
+    def close(self) -> None:
+        """Write all pending mutations, compact the backend and release its files."""
+        self.writer.close()
+        self._save_data()
+        if self.store is not None:
+            self.store.close()
+        self.backend.close()
+    
+    def refresh(self) -> None:
+        """Pick up changes made by other processes; the owning DataManager has none."""
+    
+    @timed("data")
+    def top(self, k: int, offset: int = 0) -> List[Tuple[int, UserRecord]]:
+        """
+        Get the richest users.
+        
+        Args:
+            k (int): Number of users
+            offset (int): Number of users to skip from the top
+            
+        Returns:
+            List[Tuple[int, UserRecord]]: (user_id, user data) pairs, richest first
+        """
+        self.refresh()
+        self._ensure_index()
+        return [(user_id, self._lookup(user_id)) for user_id, _ in self.balance_index.slice(offset, offset + k)]
+    
+    @timed("data")
+    def top_members(self, member_ids: Set[int], k: int) -> List[Tuple[int, UserRecord]]:
+        """
+        Get the richest users out of a set of IDs, e.g. the members of a guild.
+        
+        Args:
+            member_ids (Set[int]): User IDs to consider
+            k (int): Number of users
+            
+        Returns:
+            List[Tuple[int, UserRecord]]: (user_id, user data) pairs, richest first
+        """
+        self.refresh()
+        self._ensure_index()
+        return [(user_id, self._lookup(user_id)) for user_id, _ in self.balance_index.top_members(member_ids, k)]
+    
+    @timed("data")
+    def rank(self, user_id: UserId) -> Optional[int]:
+        """
+        Get a user's position on the global leaderboard.
+        
+        Args:
+            user_id (UserId): Discord user ID
+            
+        Returns:
+            Optional[int]: 1-based position, or None for unknown users
+        """
+        self.refresh()
+        self._ensure_index()
+        return self.balance_index.rank(int(user_id))
+    
+    @timed("data")
+    def percentile(self, user_id: UserId) -> Optional[float]:
+        """
+        Get the percentage of users a user is richer than.
+        
+        Args:
+            user_id (UserId): Discord user ID
+            
+        Returns:
+            Optional[float]: Percentile from 0 to 100, or None for unknown users
+        """
+        self.refresh()
+        self._ensure_index()
+        return self.balance_index.percentile(int(user_id))
+    
+    @timed("data")
+    def range(self, start: int, stop: int) -> List[Tuple[int, UserRecord]]:
+        """
+        Get the users at the given positions of the global leaderboard.
+        
+        Args:
+            start (int): First position, 0-based
+            stop (int): Position after the last one
+            
+        Returns:
+            List[Tuple[int, UserRecord]]: (user_id, user data) pairs, richest first
+        """
+        return self.top(stop - start, offset=start)
+    
+    @timed("data")
+    def user_count(self) -> int:
+        """
+        Get the number of users on the leaderboard.
+        
+        Returns:
+            int: Number of users with stored data
+        """
+        self.refresh()
+        self._ensure_index()
+        return len(self.balance_index)
+    
+    @timed("data")
+    def get_user_data(self, user_id: UserId) -> UserRecord:
         """
         Get a user's data, creating a new entry if the user doesn't exist.
         
         Args:
-            user_id (str): Discord user ID
+            user_id (UserId): Discord user ID
             
         Returns:
-            Dict[str, Any]: User data dictionary
+            UserRecord: User data, readable like a dictionary
         """
+        user_id = int(user_id)
+        
         # Check if user exists, create default data if not
-        if user_id not in self.data:
-            self.data[user_id] = {
-                "balance": self.default_balance,
-                "stats": {
-                    "slots_played": 0,
-                    "slots_won": 0
-                }
-            }
-            self._save_data()
+        record = self._lookup(user_id)
+        if record is None:
+            self._stage(user_id)
+            record = self.data[user_id] = self._new_user()
+            self._record(user_id)
         
-        return self.data[user_id]
+        return record
+    
+    @timed("data")
+    def has_user(self, user_id: UserId) -> bool:
+        """
+        Check whether a user has any stored data.
+        
+        Args:
+            user_id (UserId): Discord user ID
+            
+        Returns:
+            bool: Whether the user exists
+        """
+        return self._lookup(int(user_id)) is not None
     
-    def get_all_data(self) -> Dict[str, Dict[str, Any]]:
+    def get_all_data(self) -> Dict[int, UserRecord]:
         """
-        Get all user data.
+        Get all user data in memory; only the cached users when loading on demand.
         
         Returns:
-            Dict[str, Dict[str, Any]]: Dictionary of all user data
+            Dict[int, UserRecord]: User records keyed by user ID
         """
         return self.data
     
-    def update_balance(self, user_id: str, amount: int) -> int:
+    @timed("data")
+    def update_balance(self, user_id: UserId, amount: int) -> int:
         """
         Update a user's balance by adding or subtracting coins.
         
         Args:
-            user_id (str): Discord user ID
+            user_id (UserId): Discord user ID
             amount (int): Amount to add (positive) or subtract (negative)
             
         Returns:
             int: New balance
         """
-        user_data = self.get_user_data(user_id)
-        user_data["balance"] += amount
+        user_id = int(user_id)
+        record = self.get_user_data(user_id)
+        self._stage(user_id)
+        record.balance += amount
         
         # Ensure balance doesn't go negative
-        if user_data["balance"] < 0:
-            user_data["balance"] = 0
+        if record.balance < 0:
+            record.balance = 0
         
-        self._save_data()
-        return user_data["balance"]
+        self._record(user_id)
+        return record.balance
     
-    def update_stats(self, user_id: str, stat_name: str, value: Union[int, str]) -> None:
+    @timed("data")
+    def update_stats(self, user_id: UserId, stat_name: str, value: Union[int, str]) -> None:
         """
         Update a user's stats.
         
         Args:
-            user_id (str): Discord user ID
+            user_id (UserId): Discord user ID
             stat_name (str): Name of the stat to update
             value (Union[int, str]): Value to add or set
         """
-        user_data = self.get_user_data(user_id)
-        
-        # Make sure stats dict exists
-        if "stats" not in user_data:
-            user_data["stats"] = {}
+        user_id = int(user_id)
+        stats = self.get_user_data(user_id)["stats"]
+        self._stage(user_id)
         
         # For numeric values, add to existing value
-        if isinstance(value, int) and stat_name in user_data["stats"] and isinstance(user_data["stats"][stat_name], int):
-            user_data["stats"][stat_name] += value
+        if isinstance(value, int) and isinstance(stats.get(stat_name), int):
+            stats[stat_name] += value
         else:
             # Otherwise, set the value directly
-            user_data["stats"][stat_name] = value
+            stats[stat_name] = value
         
-        self._save_data()
+        self._record(user_id)
+    
+    @timed("data")
+    def set_stat(self, user_id: UserId, stat_name: str, value: Union[int, float, str]) -> None:
+        """
+        Set one of a user's stats, replacing its value rather than adding to it.
+        
+        Args:
+            user_id (UserId): Discord user ID
+            stat_name (str): Name of the stat to set, e.g. "highest_win"
+            value (Union[int, float, str]): New value
+        """
+        user_id = int(user_id)
+        stats = self.get_user_data(user_id)["stats"]
+        self._stage(user_id)
+        stats[stat_name] = value
+        self._record(user_id)
     
-    def update_user_data(self, user_id: str, key: str, value: Any) -> None:
+    @timed("data")
+    def update_user_data(self, user_id: UserId, key: str, value: Any) -> None:
         """
         Update a specific field in a user's data.
         
         Args:
-            user_id (str): Discord user ID
+            user_id (UserId): Discord user ID
             key (str): Field name to update
             value (Any): Value to set
         """
-        user_data = self.get_user_data(user_id)
-        user_data[key] = value
-        self._save_data()
+        user_id = int(user_id)
+        record = self.get_user_data(user_id)
+        self._stage(user_id)
+        record[key] = value
+        self._record(user_id)
+    
+    @timed("data")
+    def has_claimed_vote(self, user_id: UserId, vote_number: int) -> bool:
+        """
+        Check whether a user has already claimed the reward for a vote.
+        
+        Args:
+            user_id (UserId): Discord user ID
+            vote_number (int): Vote number to check
+            
+        Returns:
+            bool: Whether the vote was claimed
+        """
+        record = self._lookup(int(user_id))
+        return record is not None and record.has_vote(vote_number)
+    
+    @timed("data")
+    def claim_vote(self, user_id: UserId, vote_number: int) -> bool:
+        """
+        Mark a vote as claimed by setting its bit in the user's vote bitmap.
+        
+        Args:
+            user_id (UserId): Discord user ID
+            vote_number (int): Vote number to claim
+            
+        Returns:
+            bool: False if the vote had already been claimed, True otherwise
+        """
+        user_id = int(user_id)
+        record = self.get_user_data(user_id)
+        if record.has_vote(vote_number):
+            return False
+        
+        self._stage(user_id)
+        record.add_vote(vote_number)
+        self._record(user_id)
+        return True
+
+
+
+class DataReader(DataManager):
+    """
+    Read-only view of the data owned by another process's DataManager.
+    
+    The reader loads everything once and then asks the backend only for the
+    changes written since it last looked: new journal entries for the JSON
+    backend, rows with a newer version for SQLite. With DATA_CACHE_SIZE set it
+    loads users on demand like DataManager, and changes only replace users
+    that are cached.
+    """
+    
+    def __init__(self, data_file: str = "user_data.json", refresh_interval: float = 0.5):
+        """
+        Initialize the reader for the specified data file.
+        
+        Args:
+            data_file (str): Name of the JSON file written by the bot
+            refresh_interval (float): Minimum seconds between checks for new changes
+        """
+        self.refresh_interval = refresh_interval
+        self._last_refresh = time.monotonic()
+        super().__init__(data_file)
+    
+    def _create_backend(self) -> StorageBackend:
+        return create_backend(self.data_file, read_only=True)
+    
+    def _create_writer(self) -> Optional[BackgroundWriter]:
+        return None
+    
+    def _create_store(self) -> StorageBackend:
+        return self.backend
+    
+    def refresh(self) -> None:
+        """Apply changes written by the owning process since the last refresh."""
+        now = time.monotonic()
+        if now - self._last_refresh < self.refresh_interval:
+            return
+        self._last_refresh = now
+        
+        # The backend speaks the storage format; convert just the changed users
+        changes = {}
+        try:
+            changed_keys, self.version = self.backend.poll(changes)
+        except Exception as e:
+            logger.error(f"Error refreshing data: {str(e)}")
+            return
+        if not changed_keys:
+            return
+        
+        changed = set()
+        for key in changed_keys:
+            user_id = int(key)
+            if self.store is None or user_id in self.data:
+                self.data[user_id] = UserRecord.from_dict(changes[key])
+            if self._index_ready and self.store is not None:
+                self.balance_index.set(user_id, changes[key]["balance"])
+            changed.add(user_id)
+        
+        if self.store is None:
+            if len(changed) == len(self.data):
+                self._rebuild_index()
+            else:
+                for user_id in changed:
+                    self.balance_index.set(user_id, self.data[user_id].balance)
+        self._notify(changed)
+    
+    def _record(self, *user_ids: int) -> None:
+        raise RuntimeError("DataReader is read-only")
+    
+    def _save_data(self) -> None:
+        raise RuntimeError("DataReader is read-only")
+    
+    def set_guild_setting(self, guild_id: int, key: str, value: Any) -> None:
+        raise RuntimeError("DataReader is read-only")
+    
+    def flush(self) -> None:
+        """Nothing to flush; the reader never writes."""
+    
+    def close(self) -> None:
+        self.backend.close()
+    
+    def get_user_data(self, user_id: UserId) -> UserRecord:
+        """
+        Get a user's data, or default data for users the bot hasn't seen yet.
+        
+        Args:
+            user_id (UserId): Discord user ID
+            
+        Returns:
+            UserRecord: User data, readable like a dictionary
+        """
+        self.refresh()
+        record = self._lookup(int(user_id))
+        return record if record is not None else self._new_user()
+    
+    def get_all_data(self) -> Dict[int, UserRecord]:
+        """
+        Get all user data in memory; only the cached users when loading on demand.
+        
+        Returns:
+            Dict[int, UserRecord]: User records keyed by user ID
+        """
+        self.refresh()
+        return self.data
+
+
+_shared_manager: Optional[DataManager] = None
+_shared_manager_lock = threading.Lock()
+
+def get_data_manager() -> DataManager:
+    """
+    Get the process-wide DataManager, creating it on first use.
+    
+    This blocks while another thread is loading the data, so code on the
+    event loop should only call it once loading has finished; the bot holds
+    cog commands until then.
+    
+    Returns:
+        DataManager: The DataManager shared by every cog in this process
+    """
+    global _shared_manager
+    if _shared_manager is None:
+        # The bot loads data on a worker thread while cogs may ask for it on the event loop
+        with _shared_manager_lock:
+            if _shared_manager is None:
+                _shared_manager = DataManager()
+    return _shared_manager
+
+def close_data_manager() -> None:
+    """Flush and close the process-wide DataManager if one was created."""
+    global _shared_manager
+    with _shared_manager_lock:
+        if _shared_manager is not None:
+            _shared_manager.close()
+            _shared_manager = None
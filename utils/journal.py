@@ -0,0 +1,176 @@
+import json
+import os
+import time
+import logging
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class Journal:
+    """
+    Append-only log of data mutations, kept next to the JSON snapshot file.
+
+    Every committed mutation is written as a single JSON line. Lines are handed
+    to the OS immediately, while fsync is batched and only happens once enough
+    entries are pending or enough time has passed since the last sync. The
+    owner calls sync() once sync_deadline() passes, so entries don't wait for
+    the next append to be synced.
+    """
+
+    def __init__(self, path: str, sync_every: int = 64, sync_interval: float = 1.0):
+        """
+        Initialize the journal.
+
+        Args:
+            path (str): Path of the journal file
+            sync_every (int): Number of pending entries that triggers an fsync
+            sync_interval (float): Seconds after which pending entries are fsynced
+        """
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.entries = 0  # Entries written since the last reset
+        self.bytes_written = 0  # Bytes written by this process, including resets
+        self._pending = 0  # Entries written since the last fsync
+        self._last_sync = time.monotonic()
+        self._file = None
+
+    def replay(self) -> Iterator[Dict[str, Any]]:
+        """
+        Read back all complete entries from the journal.
+
+        A torn final line (from a crash mid-write) is dropped and truncated away
+        so that new entries are appended after the last good one.
+
+        Yields:
+            Dict[str, Any]: Journal entries in the order they were written
+        """
+        if not os.path.exists(self.path):
+            return
+
+        good_offset = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logger.warning(f"Dropping torn journal entry at offset {good_offset}")
+                    break
+                good_offset += len(line)
+                self.entries += 1
+                yield entry
+
+        if good_offset < os.path.getsize(self.path):
+            with open(self.path, 'r+b') as f:
+                f.truncate(good_offset)
+
+    def read_from(self, offset: int) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Read complete entries written after the given byte offset.
+
+        Unlike replay(), this never modifies the file, so it is safe to use
+        from a process that is only following another process's writes.
+
+        Args:
+            offset (int): Byte offset to start reading from
+
+        Returns:
+            Tuple[List[Dict[str, Any]], int]: New entries and the offset after the last complete one
+        """
+        entries = []
+        if not os.path.exists(self.path):
+            return entries, offset
+
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # Entry still being written
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    break
+                offset += len(line)
+        return entries, offset
+
+    def identity(self) -> Optional[Tuple[int, int]]:
+        """
+        Identify the current journal file, which changes whenever it is reset.
+
+        Returns:
+            Optional[Tuple[int, int]]: Device and inode of the file, or None if it doesn't exist
+        """
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_dev, st.st_ino)
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        """
+        Append an entry to the journal, syncing to disk if a threshold is reached.
+
+        Args:
+            entry (Dict[str, Any]): JSON-serializable journal entry
+        """
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+
+        line = json.dumps(entry, separators=(',', ':')) + "\n"
+        self._file.write(line)
+        self._file.flush()
+        self.bytes_written += len(line)  # JSON is ASCII-escaped, so characters are bytes
+        self.entries += 1
+        self._pending += 1
+
+        if self._pending >= self.sync_every or time.monotonic() - self._last_sync >= self.sync_interval:
+            self.sync()
+
+    def sync_deadline(self) -> Optional[float]:
+        """
+        Get when pending entries are due to be synced.
+
+        Returns:
+            Optional[float]: time.monotonic() value of the deadline, or None if nothing is pending
+        """
+        if not self._pending:
+            return None
+        return self._last_sync + self.sync_interval
+
+    def sync(self) -> None:
+        """Force all pending entries to disk."""
+        if self._file is not None and self._pending:
+            os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def reset(self, header: Optional[Dict[str, Any]] = None, entries: Iterable[Dict[str, Any]] = ()) -> None:
+        """
+        Replace all entries, called once they are folded into a snapshot or merged.
+
+        The journal is replaced by a new file rather than truncated in place,
+        so readers following it can tell that a compaction happened.
+
+        Args:
+            header (Optional[Dict[str, Any]]): Entry to start the new journal with
+            entries (Iterable[Dict[str, Any]]): Entries to keep after the header
+        """
+        self.close()
+        tmp_path = f"{self.path}.tmp"
+        self.entries = 0
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for entry in ([header] if header is not None else []) + list(entries):
+                line = json.dumps(entry, separators=(',', ':')) + "\n"
+                f.write(line)
+                self.entries += 1
+                self.bytes_written += len(line)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def close(self) -> None:
+        """Sync and close the journal file."""
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
@@ -0,0 +1,65 @@
+from collections import OrderedDict
+from typing import Any, Dict, Hashable
+
+class LRUCache(OrderedDict):
+    """
+    Dict holding at most `capacity` items, dropping the least recently used.
+
+    Reads through [] or get() mark an item as recently used; `in` does not.
+    Pinned keys are never dropped, so records in the middle of a transaction
+    stay in memory until it commits or rolls back. The item just set is never
+    dropped either; if everything else is pinned the cache grows past its
+    capacity until pins are released.
+    """
+
+    def __init__(self, capacity: int):
+        """
+        Create an empty cache.
+
+        Args:
+            capacity (int): Maximum number of unpinned items to keep
+        """
+        super().__init__()
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._pins: Dict[Hashable, int] = {}
+
+    def __getitem__(self, key: Hashable) -> Any:
+        value = super().__getitem__(key)
+        self.move_to_end(key)
+        return value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        if key in self:
+            self.hits += 1
+            return self[key]
+        self.misses += 1
+        return default
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+
+        while len(self) > self.capacity:
+            # Drop the least recently used item that isn't pinned or just set
+            for oldest in self:
+                if oldest not in self._pins and oldest != key:
+                    break
+            else:
+                break  # Everything left is pinned
+            super().__delitem__(oldest)
+            self.evictions += 1
+
+    def pin(self, key: Hashable) -> None:
+        """Keep a key in the cache until unpinned as many times as it was pinned."""
+        self._pins[key] = self._pins.get(key, 0) + 1
+
+    def unpin(self, key: Hashable) -> None:
+        """Release one pin of a key."""
+        count = self._pins.get(key, 0) - 1
+        if count > 0:
+            self._pins[key] = count
+        else:
+            self._pins.pop(key, None)
@@ -0,0 +1,396 @@
+"""
+Command metrics for the bot, exported in the Prometheus text format.
+
+Every command invocation is timed from its before-invoke hook to its
+after-invoke hook. While it runs, time spent in the data layer, the slot
+machine's random draws and Discord API calls is attributed to it through a
+context variable, so each command gets a latency histogram for its total
+wall time and one per phase. Whatever isn't in a phase, such as waiting for
+user locks or sleeping between animation frames, is the difference.
+"""
+import os
+import time
+import logging
+import contextvars
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, Any, Callable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the latency buckets in seconds; the last bucket is +Inf
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PHASES = ("data", "rng", "discord")
+
+class Histogram:
+    """Counts of observed values per bucket, with their sum."""
+
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """Record a value."""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Estimate a quantile by interpolating within its bucket, as Prometheus does.
+
+        Args:
+            q (float): Quantile between 0 and 1, e.g. 0.99
+
+        Returns:
+            Optional[float]: Estimated value, or None if nothing was observed
+        """
+        if not self.count:
+            return None
+
+        target = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= target and count:
+                if i == len(self.buckets):
+                    return self.buckets[-1]  # Beyond the last bound
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (target - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+class CommandStats:
+    """Invocations, errors and latency histograms of one command."""
+
+    __slots__ = ("invocations", "errors", "duration", "phases")
+
+    def __init__(self):
+        self.invocations = 0
+        self.errors: Dict[str, int] = {}
+        self.duration = Histogram()
+        self.phases = {name: Histogram() for name in PHASES}
+
+# Spans kept per traced invocation; a runaway loop of data calls shouldn't grow a trace without bound
+MAX_SPANS = 200
+
+class CommandTimer:
+    """
+    Timing of one command invocation in progress.
+
+    Phase totals are always kept. When the invocation is traced, every
+    phase and span inside it is also kept individually, nested ones
+    included, as (name, start offset, duration, depth) tuples.
+    """
+
+    __slots__ = ("command", "started", "phases", "active", "token", "spans", "depth")
+
+    def __init__(self, command: str, trace: bool = False):
+        self.command = command
+        self.started = time.perf_counter()
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.active: Optional[str] = None  # Phase being timed; nested phases count towards it
+        self.token: Optional[contextvars.Token] = None
+        self.spans: Optional[List[Tuple[str, float, float, int]]] = [] if trace else None
+        self.depth = 0
+
+    def enter(self, name: Optional[str]) -> Tuple[float, bool]:
+        """Start timing a phase (or a plain span if name is None); returns what exit() needs."""
+        outer = name is not None and self.active is None
+        if outer:
+            self.active = name
+        self.depth += 1
+        return time.perf_counter(), outer
+
+    def exit(self, name: Optional[str], label: str, entered: Tuple[float, bool]) -> None:
+        """Stop timing a phase or span started by enter()."""
+        started, outer = entered
+        elapsed = time.perf_counter() - started
+        self.depth -= 1
+        if outer:
+            self.phases[name] += elapsed
+            self.active = None
+        if self.spans is not None and len(self.spans) < MAX_SPANS:
+            self.spans.append((label, started - self.started, elapsed, self.depth))
+
+_current: contextvars.ContextVar[Optional[CommandTimer]] = contextvars.ContextVar("command_timer", default=None)
+
+@contextmanager
+def phase(name: str, label: Optional[str] = None) -> Iterator[None]:
+    """
+    Attribute the time spent in the block to a phase of the running command.
+
+    Does nothing outside a command. Inside another phase the time keeps
+    counting towards the outer phase, and only shows up as a span in traces.
+
+    Args:
+        name (str): One of PHASES
+        label (Optional[str]): Span name in traces, defaults to the phase name
+    """
+    timer = _current.get()
+    if timer is None or (timer.active is not None and timer.spans is None):
+        yield
+        return
+
+    entered = timer.enter(name)
+    try:
+        yield
+    finally:
+        timer.exit(name, label or name, entered)
+
+@contextmanager
+def span(label: str) -> Iterator[None]:
+    """
+    Time the block as a span in traces of the running command, without counting it towards a phase.
+
+    Args:
+        label (str): Span name
+    """
+    timer = _current.get()
+    if timer is None or timer.spans is None:
+        yield
+        return
+
+    entered = timer.enter(None)
+    try:
+        yield
+    finally:
+        timer.exit(None, label, entered)
+
+def timed(name: str) -> Callable[[Callable], Callable]:
+    """
+    Decorate a function so the time spent in it counts towards a phase.
+
+    Args:
+        name (str): One of PHASES
+
+    Returns:
+        Callable[[Callable], Callable]: The decorator
+    """
+    def decorator(func: Callable) -> Callable:
+        label = f"{name}:{func.__qualname__}"
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            timer = _current.get()
+            if timer is None or (timer.active is not None and timer.spans is None):
+                return func(*args, **kwargs)
+
+            entered = timer.enter(name)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timer.exit(name, label, entered)
+        return wrapper
+    return decorator
+
+def _labels(**labels: str) -> str:
+    """Format Prometheus labels, escaping the values."""
+    escaped = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        escaped.append(f'{key}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+class Metrics:
+    """
+    Registry of the bot's metrics.
+
+    Command metrics are recorded as commands run. Other components register
+    sources, functions returning their own counters such as the data
+    writer's, which are read whenever the metrics are rendered.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.commands: Dict[str, CommandStats] = {}
+        self.rate_limit_hits = 0
+        self._sources: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+    def start(self, command: str, trace: bool = False) -> CommandTimer:
+        """
+        Start timing a command in the current task.
+
+        Args:
+            command (str): Qualified name of the command
+            trace (bool): Also keep every span inside the invocation
+
+        Returns:
+            CommandTimer: Timer to pass to finish()
+        """
+        timer = CommandTimer(command, trace)
+        timer.token = _current.set(timer)
+        return timer
+
+    def finish(self, timer: CommandTimer) -> float:
+        """
+        Stop timing a command and record its latency.
+
+        Args:
+            timer (CommandTimer): Timer returned by start()
+
+        Returns:
+            float: Wall time of the invocation in seconds
+        """
+        elapsed = time.perf_counter() - timer.started
+        try:
+            _current.reset(timer.token)
+        except ValueError:
+            _current.set(None)  # Finished from a different context than it started in
+
+        stats = self.commands.get(timer.command)
+        if stats is None:
+            stats = self.commands[timer.command] = CommandStats()
+        stats.invocations += 1
+        stats.duration.observe(elapsed)
+        for name, seconds in timer.phases.items():
+            stats.phases[name].observe(seconds)
+        return elapsed
+
+    def error(self, command: str, error: str) -> None:
+        """
+        Count a failed command.
+
+        Args:
+            command (str): Qualified name of the command
+            error (str): Kind of error, e.g. the exception class name
+        """
+        stats = self.commands.get(command)
+        if stats is None:
+            stats = self.commands[command] = CommandStats()
+        stats.errors[error] = stats.errors.get(error, 0) + 1
+
+    def rate_limited(self) -> None:
+        """Count a request that Discord answered with a rate limit."""
+        self.rate_limit_hits += 1
+
+    def add_source(self, name: str, source: Callable[[], Dict[str, Any]]) -> None:
+        """
+        Register a function whose numeric results are exported as casino_<name>_<key>.
+
+        Args:
+            name (str): Prefix for the source's metrics
+            source (Callable[[], Dict[str, Any]]): Returns the current counters
+        """
+        self._sources[name] = source
+
+    def remove_source(self, name: str) -> None:
+        """Stop exporting a source registered with add_source()."""
+        self._sources.pop(name, None)
+
+    def source_values(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Read every registered source.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Counters by source name; sources that fail are left out
+        """
+        values = {}
+        for name, source in list(self._sources.items()):
+            try:
+                values[name] = source()
+            except Exception as e:
+                logger.error(f"Error reading metrics source {name}: {str(e)}")
+        return values
+
+    def render(self) -> str:
+        """
+        Render all metrics in the Prometheus text exposition format.
+
+        Returns:
+            str: The exposition, ending with a newline
+        """
+        lines = [
+            "# HELP casino_command_invocations_total Commands that ran to completion or failed while running.",
+            "# TYPE casino_command_invocations_total counter",
+        ]
+        commands = sorted(self.commands.items())
+        for command, stats in commands:
+            lines.append(f"casino_command_invocations_total{_labels(command=command)} {stats.invocations}")
+
+        lines.append("# HELP casino_command_errors_total Command errors by exception type, including rejected invocations.")
+        lines.append("# TYPE casino_command_errors_total counter")
+        for command, stats in commands:
+            for error, count in sorted(stats.errors.items()):
+                lines.append(f"casino_command_errors_total{_labels(command=command, error=error)} {count}")
+
+        lines.append("# HELP casino_command_duration_seconds Wall time of command invocations.")
+        lines.append("# TYPE casino_command_duration_seconds histogram")
+        for command, stats in commands:
+            lines.extend(self._histogram_lines("casino_command_duration_seconds", stats.duration, command=command))
+
+        lines.append("# HELP casino_command_phase_seconds Time per invocation spent in the data layer, RNG and Discord API calls.")
+        lines.append("# TYPE casino_command_phase_seconds histogram")
+        for command, stats in commands:
+            for name, histogram in stats.phases.items():
+                lines.extend(self._histogram_lines("casino_command_phase_seconds", histogram, command=command, phase=name))
+
+        lines.append("# HELP casino_rate_limit_hits_total Discord API requests answered with HTTP 429.")
+        lines.append("# TYPE casino_rate_limit_hits_total counter")
+        lines.append(f"casino_rate_limit_hits_total {self.rate_limit_hits}")
+
+        for name, values in sorted(self.source_values().items()):
+            for key, value in sorted(values.items()):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f"casino_{name}_{key} {value}")
+
+        lines.append(f"casino_uptime_seconds {time.time() - self.started:.3f}")
+        lines.append(f"casino_metrics_timestamp_seconds {time.time():.3f}")
+        return "\n".join(lines) + "\n"
+
+    def _histogram_lines(self, metric: str, histogram: Histogram, **labels: str) -> List[str]:
+        """Render the bucket, sum and count lines of one histogram."""
+        lines = []
+        cumulative = 0
+        for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f"{metric}_bucket{_labels(**labels, le=le)} {cumulative}")
+        lines.append(f"{metric}_sum{_labels(**labels)} {histogram.sum:.6f}")
+        lines.append(f"{metric}_count{_labels(**labels)} {histogram.count}")
+        return lines
+
+    def write(self, path: str, exposition: Optional[str] = None) -> None:
+        """
+        Atomically write the rendered metrics to a file, for the web app to serve.
+
+        Args:
+            path (str): File to write
+            exposition (Optional[str]): Already rendered metrics, rendered now if None
+        """
+        exposition = self.render() if exposition is None else exposition
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(exposition)
+        os.replace(tmp_path, path)
+
+class RateLimitCounter(logging.Handler):
+    """
+    Counts Discord rate limit hits from discord.py's HTTP log.
+
+    discord.py retries 429 responses itself and only logs them, so this
+    handler is attached to the "discord.http" logger to see them. Every 429
+    is logged as "We are being rate limited", and a global one is followed by
+    a "Global rate limit has been hit" line, so only the first is counted.
+    """
+
+    def __init__(self, metrics: "Metrics"):
+        super().__init__(logging.WARNING)
+        self.metrics = metrics
+
+    def emit(self, record: logging.LogRecord) -> None:
+        message = str(record.msg)
+        if message.startswith("We are being rate limited"):
+            self.metrics.rate_limited()
+
+def metrics_file() -> str:
+    """Get the file the bot exports its metrics to, set by the METRICS_FILE environment variable."""
+    return os.environ.get("METRICS_FILE", "bot_metrics.prom")
+
+# Metrics of this process
+metrics = Metrics()
@@ -0,0 +1,154 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAYTABLE_FILE = "paytable.json"
+
+# What the wild and scatter rules mean for players; the rules themselves live in SlotMachine
+SPECIAL_RULES = {
+    "wild": "Replaces any symbol except Scatter",
+    "scatter": "Counts anywhere on the line",
+}
+
+class Paytable:
+    """
+    The slot machine's symbols, weights and payouts.
+
+    This is the one definition the slot machine, the bot's embeds, the web
+    API and the How to Play page all read from. Its version is a hash of the
+    content, so every process that loads the same table agrees on the
+    version, and any change to the table gives a new one.
+    """
+
+    def __init__(self, symbols: Dict[str, str], weights: Dict[str, float],
+                 payouts: Dict[str, Dict[int, float]], wild: str, scatter: str):
+        """
+        Create a paytable.
+
+        Args:
+            symbols (Dict[str, str]): Symbol type (Rare, Common, ...) by symbol, in display order
+            weights (Dict[str, float]): Relative weight of each symbol on a reel
+            payouts (Dict[str, Dict[int, float]]): Payout multiplier per symbol and match count
+            wild (str): Symbol that substitutes for any symbol except the scatter
+            scatter (str): Symbol that counts anywhere on the line
+        """
+        self.symbols = symbols
+        self.weights = weights
+        self.payouts = payouts
+        self.wild = wild
+        self.scatter = scatter
+
+        canonical = json.dumps(self.to_dict(), sort_keys=True, separators=(",", ":"))
+        self.version = hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Paytable":
+        """
+        Build a paytable from its config format.
+
+        Args:
+            data (Dict[str, Any]): Config with "wild", "scatter" and a "symbols" list
+
+        Returns:
+            Paytable: The paytable
+        """
+        symbols, weights, payouts = {}, {}, {}
+        for entry in data["symbols"]:
+            symbol = entry["symbol"]
+            symbols[symbol] = entry["type"]
+            weights[symbol] = entry["weight"]
+            payouts[symbol] = {int(count): multiplier for count, multiplier in entry["payouts"].items()}
+        return cls(symbols, weights, payouts, data["wild"], data["scatter"])
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Convert the paytable to its config format.
+
+        Returns:
+            Dict[str, Any]: Config that from_dict() reads back into the same paytable
+        """
+        return {
+            "wild": self.wild,
+            "scatter": self.scatter,
+            "symbols": [
+                {
+                    "symbol": symbol,
+                    "type": symbol_type,
+                    "weight": self.weights.get(symbol, 0),
+                    "payouts": {str(count): multiplier for count, multiplier in sorted(self.payouts.get(symbol, {}).items())}
+                }
+                for symbol, symbol_type in self.symbols.items()
+            ]
+        }
+
+    def special(self, symbol: str) -> Optional[str]:
+        """Get the description of a symbol's special rule, if it has one."""
+        if symbol == self.wild:
+            return SPECIAL_RULES["wild"]
+        if symbol == self.scatter:
+            return SPECIAL_RULES["scatter"]
+        return None
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """
+        Describe each symbol for display.
+
+        Returns:
+            List[Dict[str, Any]]: Symbol, type, weight, payout_3, payout_2 and special
+                (None for symbols without a special rule), in display order
+        """
+        return [
+            {
+                "symbol": symbol,
+                "type": symbol_type,
+                "weight": self.weights.get(symbol, 0),
+                "payout_3": self.payouts.get(symbol, {}).get(3, 0),
+                "payout_2": self.payouts.get(symbol, {}).get(2, 0),
+                "special": self.special(symbol)
+            }
+            for symbol, symbol_type in self.symbols.items()
+        ]
+
+_loaded: Dict[str, Tuple[Tuple[int, int], Paytable]] = {}
+_load_lock = threading.Lock()
+
+def paytable_file() -> str:
+    """Get the paytable config path, set by the PAYTABLE_FILE environment variable."""
+    return os.environ.get("PAYTABLE_FILE", DEFAULT_PAYTABLE_FILE)
+
+def load_paytable(path: Optional[str] = None) -> Paytable:
+    """
+    Load the paytable config, reusing the last load while the file is unchanged.
+
+    Checking for changes costs one stat() call, so callers can load the
+    paytable whenever they need it and pick up edits to the file.
+
+    Args:
+        path (Optional[str]): Config file, defaults to paytable_file()
+
+    Returns:
+        Paytable: The paytable in the file
+    """
+    path = path or paytable_file()
+    stat = os.stat(path)
+    key = (stat.st_mtime_ns, stat.st_size)
+
+    cached = _loaded.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    with _load_lock:
+        cached = _loaded.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        with open(path, "r", encoding="utf-8") as f:
+            paytable = Paytable.from_dict(json.load(f))
+        _loaded[path] = (key, paytable)
+        logger.info(f"Loaded paytable {paytable.version} from {path}")
+        return paytable
@@ -0,0 +1,251 @@
+"""
+Evaluate many candidate paytables in parallel, one process per CPU core.
+
+Candidates come from a grid spec or from random perturbations of the current
+SYMBOL_WEIGHTS and PAYOUTS. Each candidate gets its exact odds and, with
+--spins, a Monte Carlo run on its own independently seeded random stream.
+Results are written to a CSV file with one row per candidate.
+
+    python -m utils.paytable_sweep --grid grid.json --spins 1000000 --out sweep.csv
+    python -m utils.paytable_sweep --random 500 --jitter 0.25 --seed 7
+
+A grid spec lists the values to try per symbol; every combination is tried,
+and symbols or counts that aren't listed keep their current values:
+
+    {"weights": {"7️⃣": [1, 2]}, "payouts": {"7️⃣": {"3": [250, 500]}, "💎": {"2": [5, 10]}}}
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Iterator, Optional, Tuple
+
+import numpy as np
+
+from utils.slot_machine import SlotMachine
+from utils.slot_simulation import simulate
+
+Candidate = Tuple[Dict[str, float], Dict[str, Dict[int, float]]]
+
+def build_machine(weights: Dict[str, float], payouts: Dict[str, Dict[int, float]]) -> SlotMachine:
+    """
+    Create a slot machine with the given paytable.
+
+    Args:
+        weights (Dict[str, float]): Symbol weights
+        payouts (Dict[str, Dict[int, float]]): Payout multipliers per symbol and match count
+
+    Returns:
+        SlotMachine: Slot machine with compiled tables for the paytable
+    """
+    machine = SlotMachine()
+    machine.PAYOUTS = payouts
+    machine.SYMBOL_WEIGHTS = weights  # Rebuilds the sampler and payout table
+    return machine
+
+def validate_grid(spec: Any, base: SlotMachine) -> None:
+    """
+    Check that a grid spec only lists symbols and counts the paytable has.
+
+    Args:
+        spec (Any): Grid spec as read from the JSON file
+        base (SlotMachine): Slot machine whose paytable the spec varies
+
+    Raises:
+        ValueError: Naming the first section, symbol or count that is invalid
+    """
+    if not isinstance(spec, dict):
+        raise ValueError("grid spec must be a JSON object with \"weights\" and/or \"payouts\"")
+    unknown = set(spec) - {"weights", "payouts"}
+    if unknown:
+        raise ValueError(f"unknown grid section {sorted(unknown)[0]!r}, expected \"weights\" or \"payouts\"")
+
+    def check_values(where: str, values: Any) -> None:
+        if not isinstance(values, list) or not values:
+            raise ValueError(f"{where} must be a non-empty list of values")
+        for value in values:
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError(f"{where} has non-numeric value {value!r}")
+
+    for symbol, values in spec.get("weights", {}).items():
+        if symbol not in base.SYMBOL_WEIGHTS:
+            raise ValueError(f"weights: unknown symbol {symbol!r}, the paytable has {' '.join(base.SYMBOL_WEIGHTS)}")
+        check_values(f"weights[{symbol!r}]", values)
+
+    for symbol, counts in spec.get("payouts", {}).items():
+        if symbol not in base.PAYOUTS:
+            raise ValueError(f"payouts: unknown symbol {symbol!r}, the paytable has {' '.join(base.PAYOUTS)}")
+        if not isinstance(counts, dict):
+            raise ValueError(f"payouts[{symbol!r}] must map match counts to lists of values")
+        for count, values in counts.items():
+            if not str(count).isdecimal() or int(count) not in base.PAYOUTS[symbol]:
+                known = ", ".join(str(known) for known in sorted(base.PAYOUTS[symbol]))
+                raise ValueError(f"payouts[{symbol!r}]: unknown match count {count!r}, expected one of {known}")
+            check_values(f"payouts[{symbol!r}][{count!r}]", values)
+
+def grid_candidates(spec: Dict[str, Any], base: SlotMachine) -> Iterator[Candidate]:
+    """
+    Generate every combination of the values listed in a grid spec.
+
+    Args:
+        spec (Dict[str, Any]): Grid spec with optional "weights" and "payouts" sections
+        base (SlotMachine): Slot machine supplying the values that aren't listed
+
+    Yields:
+        Candidate: Weights and payouts of one candidate
+
+    Raises:
+        ValueError: If the spec names a symbol or count the paytable doesn't have
+    """
+    validate_grid(spec, base)
+
+    axes = []
+    for symbol, values in spec.get("weights", {}).items():
+        axes.append((("weights", symbol, None), values))
+    for symbol, counts in spec.get("payouts", {}).items():
+        for count, values in counts.items():
+            axes.append((("payouts", symbol, int(count)), values))
+
+    for combo in itertools.product(*(values for _, values in axes)):
+        weights = dict(base.SYMBOL_WEIGHTS)
+        payouts = {symbol: dict(table) for symbol, table in base.PAYOUTS.items()}
+        for ((section, symbol, count), _), value in zip(axes, combo):
+            if section == "weights":
+                weights[symbol] = value
+            else:
+                payouts[symbol][count] = value
+        yield weights, payouts
+
+def random_candidates(n: int, jitter: float, base: SlotMachine, rng: random.Random) -> Iterator[Candidate]:
+    """
+    Generate candidates by scaling every weight and payout by a random factor.
+
+    Args:
+        n (int): Number of candidates
+        jitter (float): Maximum relative change, e.g. 0.25 for +/-25%
+        base (SlotMachine): Slot machine whose paytable is perturbed
+        rng (random.Random): Random generator for the perturbations
+
+    Yields:
+        Candidate: Weights and payouts of one candidate
+    """
+    for _ in range(n):
+        weights = {
+            symbol: max(1, round(weight * rng.uniform(1 - jitter, 1 + jitter)))
+            for symbol, weight in base.SYMBOL_WEIGHTS.items()
+        }
+        payouts = {
+            symbol: {
+                count: round(payout * rng.uniform(1 - jitter, 1 + jitter) * 4) / 4  # Nearest 0.25
+                for count, payout in table.items()
+            }
+            for symbol, table in base.PAYOUTS.items()
+        }
+        yield weights, payouts
+
+def evaluate(task: Tuple[int, Candidate, int, Optional[np.random.SeedSequence]]) -> Dict[str, Any]:
+    """
+    Evaluate one candidate; runs in a worker process.
+
+    Args:
+        task: Candidate number, the candidate, spins to simulate and the candidate's seed sequence
+
+    Returns:
+        Dict[str, Any]: One CSV row for the candidate
+    """
+    index, (weights, payouts), spins, seed_seq = task
+    machine = build_machine(weights, payouts)
+    exact = machine.odds()
+
+    row = {
+        "candidate": index,
+        "rtp": exact["rtp"],
+        "hit_rate": exact["hit_rate"],
+        "break_even_rate": exact["break_even_rate"],
+        "big_win_rate": exact["big_win_rate"],
+        "variance": exact["variance"],
+        "max_multiplier": exact["max_multiplier"],
+        "max_win_rate": exact["max_win_rate"],
+        "weights": json.dumps(weights, ensure_ascii=False),
+        "payouts": json.dumps(payouts, ensure_ascii=False)
+    }
+
+    if spins:
+        simulated = simulate(machine, spins, rng=np.random.default_rng(seed_seq))
+        row["sim_rtp"] = simulated["rtp"]
+        row["sim_rtp_ci_low"], row["sim_rtp_ci_high"] = simulated["rtp_ci"]
+        row["sim_hit_rate"] = simulated["hit_rate"]
+        row["sim_max_win_rate"] = simulated["max_win_rate"]
+
+    return row
+
+def run_sweep(candidates: List[Candidate], spins: int = 0, seed: Optional[int] = None,
+              workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Evaluate candidates across a process pool.
+
+    Args:
+        candidates (List[Candidate]): Paytables to evaluate
+        spins (int): Spins to simulate per candidate, or 0 for exact odds only
+        seed (Optional[int]): Root seed; each candidate gets an independent child stream
+        workers (Optional[int]): Number of worker processes, defaults to the CPU count
+
+    Returns:
+        List[Dict[str, Any]]: One row per candidate, in candidate order
+    """
+    workers = workers or os.cpu_count() or 1
+    seeds = np.random.SeedSequence(seed).spawn(len(candidates))
+    tasks = [(i, candidate, spins, seeds[i]) for i, candidate in enumerate(candidates)]
+
+    # Batch cheap exact-only tasks so inter-process overhead doesn't dominate
+    chunksize = 1 if spins else max(1, len(tasks) // (workers * 8))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(evaluate, tasks, chunksize=chunksize))
+
+def write_csv(rows: List[Dict[str, Any]], path: str) -> None:
+    """
+    Write sweep results to a CSV file.
+
+    Args:
+        rows (List[Dict[str, Any]]): Rows returned by run_sweep
+        path (str): Output file path
+    """
+    fieldnames = list(dict.fromkeys(key for row in rows for key in row))
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+def main() -> None:
+    """Parse the command line, run the sweep and write the results."""
+    parser = argparse.ArgumentParser(description="Evaluate candidate slot paytables in parallel")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--grid", help="JSON grid spec listing values to try per symbol")
+    source.add_argument("--random", type=int, help="number of random candidates to generate")
+    parser.add_argument("--jitter", type=float, default=0.25, help="maximum relative change for --random")
+    parser.add_argument("--spins", type=int, default=0, help="spins to simulate per candidate (0 = exact odds only)")
+    parser.add_argument("--seed", type=int, default=None, help="root random seed")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--out", default="sweep.csv", help="output CSV file")
+    args = parser.parse_args()
+
+    base = SlotMachine()
+    if args.grid:
+        try:
+            with open(args.grid, 'r', encoding='utf-8') as f:
+                candidates = list(grid_candidates(json.load(f), base))
+        except (OSError, ValueError) as e:
+            parser.error(f"invalid grid spec {args.grid}: {e}")
+    else:
+        candidates = list(random_candidates(args.random, args.jitter, base, random.Random(args.seed)))
+
+    rows = run_sweep(candidates, spins=args.spins, seed=args.seed, workers=args.workers)
+    write_csv(rows, args.out)
+    print(f"Evaluated {len(rows)} paytables, results written to {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+Opt-in profiling of the bot's command handlers.
+
+Turned on with PROFILING=1 or the bot owner's !profile command, and off
+again the same way, without a restart. While on:
+
+- every command invocation is traced: each data call, random draw,
+  Discord API request and lock wait inside it is kept as a span;
+- invocations slower than PROFILE_SLOW_MS (250 by default) are written as
+  JSON lines to a rotating trace file with the command, user and guild;
+- every PROFILE_SAMPLE_INTERVAL seconds (300 by default) the event loop
+  thread is profiled with cProfile for a few seconds, and the snapshot is
+  saved as a .prof file with a text summary next to it.
+
+    python -m pstats profiles/loop-20250101-120000.prof
+"""
+import os
+import io
+import json
+import glob
+import asyncio
+import cProfile
+import pstats
+import logging
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+from typing import Dict, Any, Optional
+from utils.metrics import CommandTimer
+
+logger = logging.getLogger(__name__)
+
+class Profiler:
+    """Slow-command traces and sampled event loop profiles, off unless enabled."""
+
+    def __init__(self, enabled: Optional[bool] = None, slow_threshold: Optional[float] = None,
+                 trace_file: str = "slow_commands.log", max_bytes: int = 5 * 1024 * 1024, backups: int = 3,
+                 snapshot_dir: str = "profiles", sample_interval: Optional[float] = None,
+                 sample_seconds: float = 5.0, keep_snapshots: int = 10):
+        """
+        Configure the profiler.
+
+        Args:
+            enabled (Optional[bool]): Whether to profile from the start, defaults to the PROFILING environment variable
+            slow_threshold (Optional[float]): Seconds after which an invocation is traced to the file,
+                defaults to PROFILE_SLOW_MS
+            trace_file (str): File for slow-command traces
+            max_bytes (int): Size at which the trace file is rotated
+            backups (int): Rotated trace files to keep
+            snapshot_dir (str): Directory for cProfile snapshots
+            sample_interval (Optional[float]): Seconds between snapshots, defaults to PROFILE_SAMPLE_INTERVAL
+            sample_seconds (float): Length of each snapshot in seconds
+            keep_snapshots (int): Snapshots to keep before deleting the oldest
+        """
+        if enabled is None:
+            enabled = os.environ.get("PROFILING", "").lower() in ("1", "true", "on", "yes")
+        if slow_threshold is None:
+            slow_threshold = float(os.environ.get("PROFILE_SLOW_MS", "250")) / 1000
+        if sample_interval is None:
+            sample_interval = float(os.environ.get("PROFILE_SAMPLE_INTERVAL", "300"))
+
+        self.enabled = enabled
+        self.slow_threshold = slow_threshold
+        self.trace_file = trace_file
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.snapshot_dir = snapshot_dir
+        self.sample_interval = sample_interval
+        self.sample_seconds = sample_seconds
+        self.keep_snapshots = keep_snapshots
+
+        self.traced = 0  # Invocations traced while enabled
+        self.slow = 0  # Traces written to the trace file
+        self.snapshots = 0
+        self.last_snapshot: Optional[str] = None
+
+        self._traces: Optional[logging.Logger] = None
+        self._sampler: Optional[asyncio.Task] = None
+        self._sampling = False
+
+    def start(self) -> None:
+        """Turn profiling on; call from the event loop so the sampler can start."""
+        self.enabled = True
+        if self._sampler is None or self._sampler.done():
+            self._sampler = asyncio.get_running_loop().create_task(self._sample_loop())
+        logger.info(f"Profiling on: tracing commands slower than {self.slow_threshold * 1000:.0f}ms to {self.trace_file}")
+
+    def stop(self) -> None:
+        """Turn profiling off and stop the sampler."""
+        self.enabled = False
+        if self._sampler is not None:
+            self._sampler.cancel()
+            self._sampler = None
+        logger.info("Profiling off")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get counters describing what the profiler has recorded.
+
+        Returns:
+            Dict[str, Any]: Whether it is enabled, traced and slow invocations, and snapshots taken
+        """
+        return {"enabled": int(self.enabled), "traced": self.traced, "slow": self.slow, "snapshots": self.snapshots}
+
+    def record(self, ctx, timer: CommandTimer, elapsed: float) -> None:
+        """
+        Write the trace of a finished invocation if it was slow.
+
+        Args:
+            ctx (commands.Context): Context of the invocation
+            timer (CommandTimer): Timer of the invocation, with spans if it was traced
+            elapsed (float): Wall time of the invocation in seconds
+        """
+        if timer.spans is None:
+            return
+        self.traced += 1
+        if elapsed < self.slow_threshold:
+            return
+
+        self.slow += 1
+        trace = {
+            "time": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "command": timer.command,
+            "user": ctx.author.id,
+            "guild": ctx.guild.id if ctx.guild else None,
+            "channel": ctx.channel.id,
+            "failed": bool(ctx.command_failed),
+            "duration_ms": round(elapsed * 1000, 3),
+            "phases_ms": {name: round(seconds * 1000, 3) for name, seconds in timer.phases.items()},
+            "spans": [
+                {"name": name, "start_ms": round(start * 1000, 3), "duration_ms": round(duration * 1000, 3), "depth": depth}
+                for name, start, duration, depth in sorted(timer.spans, key=lambda span: span[1])
+            ]
+        }
+        self._trace_logger().info(json.dumps(trace, separators=(",", ":")))
+
+    def _trace_logger(self) -> logging.Logger:
+        """Get the logger writing the trace file, creating the file on first use."""
+        if self._traces is None:
+            handler = RotatingFileHandler(self.trace_file, maxBytes=self.max_bytes, backupCount=self.backups, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            traces = logging.getLogger(f"{__name__}.traces")
+            traces.setLevel(logging.INFO)
+            traces.propagate = False  # Traces go to their own file, not the bot's log
+            traces.addHandler(handler)
+            self._traces = traces
+        return self._traces
+
+    async def _sample_loop(self) -> None:
+        """Take a snapshot every sample_interval seconds while enabled."""
+        while self.enabled:
+            await asyncio.sleep(self.sample_interval)
+            await self.snapshot()
+
+    async def snapshot(self, seconds: Optional[float] = None) -> Optional[str]:
+        """
+        Profile the event loop thread for a while and save the result.
+
+        Args:
+            seconds (Optional[float]): How long to profile, defaults to sample_seconds
+
+        Returns:
+            Optional[str]: Path of the .prof file, or None if profiling couldn't start
+        """
+        if self._sampling:
+            return None  # A snapshot is already running
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:
+            logger.warning(f"Could not start a profiling snapshot: {str(e)}")
+            return None
+
+        self._sampling = True
+        try:
+            await asyncio.sleep(self.sample_seconds if seconds is None else seconds)
+        finally:
+            profile.disable()
+            self._sampling = False
+
+        path = os.path.join(self.snapshot_dir, datetime.now().strftime("loop-%Y%m%d-%H%M%S.prof"))
+        try:
+            await asyncio.to_thread(self._save, profile, path)
+        except Exception as e:
+            logger.error(f"Error saving profiling snapshot: {str(e)}")
+            return None
+
+        self.snapshots += 1
+        self.last_snapshot = path
+        logger.info(f"Saved profiling snapshot {path}")
+        return path
+
+    def _save(self, profile: cProfile.Profile, path: str) -> None:
+        """Write a snapshot and its summary, and delete the oldest snapshots over the limit."""
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        profile.dump_stats(path)
+
+        summary = io.StringIO()
+        pstats.Stats(profile, stream=summary).sort_stats("cumulative").print_stats(40)
+        with open(f"{path}.txt", "w", encoding="utf-8") as f:
+            f.write(summary.getvalue())
+
+        snapshots = sorted(glob.glob(os.path.join(self.snapshot_dir, "loop-*.prof")))
+        for old in snapshots[:-self.keep_snapshots]:
+            for stale in (old, f"{old}.txt"):
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass
+
+# Profiler of this process
+profiler = Profiler()
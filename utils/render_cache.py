@@ -0,0 +1,42 @@
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+class RenderCache:
+    """
+    Rendered output, such as embeds, built once per version of its source.
+
+    Each entry remembers the version of the data it was built from, like the
+    paytable or the bot's command set, and is rebuilt the first time it is
+    asked for with a different version. Entries are shared between callers,
+    so they must be treated as read-only; sending an embed doesn't change it.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Hashable, Tuple[Hashable, Any]] = {}
+        self.hits = 0
+        self.builds = 0
+
+    def get(self, key: Hashable, version: Hashable, build: Callable[[], Any]) -> Any:
+        """
+        Get an entry, building it if it is missing or out of date.
+
+        Args:
+            key (Hashable): Name of the entry
+            version (Hashable): Version of the data the entry shows
+            build (Callable[[], Any]): Builds the entry from the current data
+
+        Returns:
+            Any: The cached entry; treat as read-only
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            self.hits += 1
+            return entry[1]
+
+        value = build()
+        self._entries[key] = (version, value)
+        self.builds += 1
+        return value
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        self._entries.clear()
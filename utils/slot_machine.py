@@ -1,55 +1,201 @@
 import random
-from typing import Dict, List, Any, Tuple
+import itertools
+from typing import Dict, List, Any, Tuple, Optional
+from utils.paytable import Paytable, load_paytable
+from utils.metrics import timed
+
+class AliasSampler:
+    """
+    Draws items with given weights in O(1) per draw using Vose's alias method.
+    
+    The weights are compiled once into a probability table and an alias table;
+    each draw then needs a single random number and two list lookups.
+    """
+    
+    def __init__(self, weights: Dict[Any, float], rng: Optional[random.Random] = None):
+        """
+        Build the alias tables for the given weights.
+        
+        Args:
+            weights (Dict[Any, float]): Items and their relative weights
+            rng (Optional[random.Random]): Random number generator, defaults to the random module
+        """
+        self.items = list(weights)
+        self.rng = rng or random
+        n = len(self.items)
+        total = sum(weights.values())
+        
+        # Scale probabilities so the average bucket holds exactly 1
+        scaled = [weights[item] * n / total for item in self.items]
+        self.prob = [1.0] * n
+        self.alias = list(range(n))
+        
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            
+            # The large item donates the rest of bucket s
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+        
+        # Whatever is left is 1 up to rounding error
+        for i in small + large:
+            self.prob[i] = 1.0
+    
+    def draw(self) -> Any:
+        """
+        Draw a single item.
+        
+        Returns:
+            Any: The drawn item
+        """
+        u = self.rng.random() * len(self.items)
+        i = int(u)
+        return self.items[i] if u - i < self.prob[i] else self.items[self.alias[i]]
+    
+    def sample(self, n: int) -> List[Any]:
+        """
+        Draw many items at once.
+        
+        Args:
+            n (int): Number of items to draw
+            
+        Returns:
+            List[Any]: The drawn items
+        """
+        items, prob, alias = self.items, self.prob, self.alias
+        count = len(items)
+        rand = self.rng.random
+        
+        result = []
+        for _ in range(n):
+            u = rand() * count
+            i = int(u)
+            result.append(items[i] if u - i < prob[i] else items[alias[i]])
+        return result
 
 class SlotMachine:
     """
     Implements a slot machine game with configurable symbols, weights, and payouts.
     """
     
-    def __init__(self):
-        """Initialize the slot machine with symbols, weights, and payouts."""
-        # Define symbols and their weights (probability)
-        self.SYMBOLS = {
-            "7️⃣": "Rare",     # Seven
-            "💎": "Uncommon",  # Diamond
-            "🎰": "Wild",      # Wild
-            "*️⃣": "Scatter",   # Scatter
-            "🔔": "Medium",    # Bell
-            "🍊": "Common",    # Orange
-            "🍋": "Common",    # Lemon
-            "❤️": "Common",    # Heart
-            "🍒": "Common"     # Cherry
-        }
+    def __init__(self, paytable: Optional[Paytable] = None):
+        """
+        Initialize the slot machine with symbols, weights, and payouts.
         
-        # Symbol weights (higher = more likely)
-        self.SYMBOL_WEIGHTS = {
-            "7️⃣": 1,    # Rare
-            "💎": 3,    # Uncommon
-            "🎰": 5,    # Wild
-            "*️⃣": 8,    # Scatter
-            "🔔": 12,   # Medium
-            "🍊": 18,   # Common
-            "🍋": 20,   # Common
-            "❤️": 22,   # Common
-            "🍒": 25    # Most common
-        }
+        Args:
+            paytable (Optional[Paytable]): Paytable to use, defaults to the paytable config file
+        """
+        self.load(paytable or load_paytable())
+    
+    def load(self, paytable: Paytable) -> None:
+        """
+        Switch to a paytable and recompile the tables.
+        
+        Args:
+            paytable (Paytable): Paytable to use
+        """
+        # Symbol types, in display order
+        self.SYMBOLS = dict(paytable.symbols)
+        
+        # Symbol weights (higher = more likely); assigning a new dict later rebuilds the tables
+        self._symbol_weights = dict(paytable.weights)
         
         # Payout multipliers for matches
-        self.PAYOUTS = {
-            "7️⃣": {2: 25, 3: 500},   # 7s
-            "💎": {2: 10, 3: 25},     # Diamond
-            "🎰": {2: 3, 3: 5},       # Wild
-            "*️⃣": {2: 2, 3: 3},       # Scatter
-            "🔔": {2: 1, 3: 2},       # Bell
-            "🍊": {2: 1, 3: 1},       # Orange
-            "🍋": {2: 1, 3: 0.75},    # Lemon
-            "❤️": {2: 0.75, 3: 0.5},  # Heart
-            "🍒": {2: 0.25, 3: 0.5}   # Cherry
-        }
+        self.PAYOUTS = {symbol: dict(payouts) for symbol, payouts in paytable.payouts.items()}
         
         # Special rules for wilds and scatters
-        self.WILD = "🎰"
-        self.SCATTER = "*️⃣"
+        self.WILD = paytable.wild
+        self.SCATTER = paytable.scatter
+        
+        # Compile the sampler and the payout table for every reel combination
+        self.refresh()
+    
+    @property
+    def SYMBOL_WEIGHTS(self) -> Dict[str, int]:
+        return self._symbol_weights
+    
+    @SYMBOL_WEIGHTS.setter
+    def SYMBOL_WEIGHTS(self, weights: Dict[str, int]) -> None:
+        self._symbol_weights = weights
+        self.refresh()
+    
+    def refresh(self) -> None:
+        """
+        Recompile the symbol sampler and payout table.
+        
+        Call this after changing SYMBOL_WEIGHTS or PAYOUTS in place. The
+        paytable's version is recomputed, so anything rendered from it can
+        tell it is out of date.
+        """
+        self.paytable = Paytable(self.SYMBOLS, self._symbol_weights, self.PAYOUTS, self.WILD, self.SCATTER)
+        self.version = self.paytable.version
+        self._sampler = AliasSampler(self._symbol_weights)
+        self._symbol_index = {symbol: i for i, symbol in enumerate(self._sampler.items)}
+        self._odds = None
+        
+        # One (multiplier, pattern) entry per reel combination, in the order
+        # of _table_index (symbols in SYMBOL_WEIGHTS order): with 9 symbols
+        # that is 729 entries
+        self.payout_table: List[Tuple[float, str]] = [
+            self._evaluate(list(symbols))
+            for symbols in itertools.product(self._sampler.items, repeat=3)
+        ]
+    
+    def odds(self) -> Dict[str, float]:
+        """
+        Calculate the exact odds by enumerating every reel combination.
+        
+        The result is cached until the tables are rebuilt by refresh().
+        
+        Returns:
+            Dict[str, float]: Return to player, hit rates, variance and the top prize
+                (all rates and the RTP as fractions of 1, per spin)
+        """
+        if self._odds is not None:
+            return self._odds
+        
+        total_weight = sum(self._symbol_weights.values())
+        probs = [self._symbol_weights[symbol] / total_weight for symbol in self._sampler.items]
+        
+        rtp = hit_rate = break_even_rate = big_win_rate = second_moment = 0.0
+        max_multiplier = max(multiplier for multiplier, _ in self.payout_table)
+        max_win_rate = 0.0
+        
+        combos = itertools.product(range(len(probs)), repeat=3)
+        for (a, b, c), (multiplier, _) in zip(combos, self.payout_table):
+            p = probs[a] * probs[b] * probs[c]
+            rtp += p * multiplier
+            second_moment += p * multiplier * multiplier
+            if multiplier > 0:
+                hit_rate += p
+            if multiplier >= 1:
+                break_even_rate += p
+            if multiplier >= 10:
+                big_win_rate += p
+            if multiplier == max_multiplier:
+                max_win_rate += p
+        
+        self._odds = {
+            "rtp": rtp,
+            "hit_rate": hit_rate,
+            "break_even_rate": break_even_rate,
+            "big_win_rate": big_win_rate,
+            "variance": second_moment - rtp * rtp,
+            "max_multiplier": max_multiplier,
+            "max_win_rate": max_win_rate
+        }
+        return self._odds
+    
+    def _table_index(self, symbols: List[str]) -> int:
+        """Position of a reel combination in the payout table."""
+        n = len(self._symbol_index)
+        a, b, c = (self._symbol_index[symbol] for symbol in symbols)
+        return (a * n + b) * n + c
     
     def get_random_symbol(self) -> str:
         """
@@ -58,17 +204,21 @@ class SlotMachine:
         Returns:
             str: A randomly selected symbol
         """
-        total_weight = sum(self.SYMBOL_WEIGHTS.values())
-        random_val = random.random() * total_weight
-        
-        for symbol, weight in self.SYMBOL_WEIGHTS.items():
-            random_val -= weight
-            if random_val <= 0:
-                return symbol
+        return self._sampler.draw()
+    
+    def sample(self, n: int) -> List[str]:
+        """
+        Get many random symbols at once, e.g. for batch spins or simulations.
         
-        # Fallback to most common symbol (cherry)
-        return "🍒"
+        Args:
+            n (int): Number of symbols to draw
+            
+        Returns:
+            List[str]: Randomly selected symbols
+        """
+        return self._sampler.sample(n)
     
+    @timed("rng")
     def spin(self) -> Dict[str, Any]:
         """
         Spin the slot machine and calculate results.
@@ -77,11 +227,10 @@ class SlotMachine:
             Dict[str, Any]: Dictionary containing symbols, multiplier, and matching pattern
         """
         # Generate 3 random symbols
-        symbols = [self.get_random_symbol() for _ in range(3)]
+        symbols = self.sample(3)
         
-        # Calculate winnings
-        multiplier = self._calculate_payout(symbols)
-        pattern = self._get_winning_pattern(symbols)
+        # Look up winnings
+        multiplier, pattern = self.payout_table[self._table_index(symbols)]
         
         return {
             "symbols": symbols,
@@ -89,6 +238,29 @@ class SlotMachine:
             "pattern": pattern
         }
     
+    @timed("rng")
+    def spin_many(self, n: int) -> List[Dict[str, Any]]:
+        """
+        Spin the slot machine n times in one batch.
+        
+        Args:
+            n (int): Number of spins
+            
+        Returns:
+            List[Dict[str, Any]]: One result per spin, in the same format as spin()
+        """
+        reels = self.sample(3 * n)
+        results = []
+        for i in range(0, 3 * n, 3):
+            symbols = reels[i:i + 3]
+            multiplier, pattern = self.payout_table[self._table_index(symbols)]
+            results.append({
+                "symbols": symbols,
+                "multiplier": multiplier,
+                "pattern": pattern
+            })
+        return results
+    
     def _calculate_payout(self, symbols: List[str]) -> float:
         """
         Calculate the payout multiplier for a given set of symbols.
@@ -99,32 +271,7 @@ class SlotMachine:
         Returns:
             float: Payout multiplier
         """
-        # Count occurrences of each symbol
-        counts = {}
-        for symbol in self.SYMBOLS:
-            # Regular symbols
-            symbol_count = symbols.count(symbol)
-            counts[symbol] = symbol_count
-            
-            # Count wilds as matching for non-scatter symbols
-            if symbol != self.SCATTER:
-                counts[symbol] += symbols.count(self.WILD)
-        
-        # Find the highest paying combination
-        max_payout = 0
-        
-        for symbol, count in counts.items():
-            # Minimum 2 matches for a win
-            if count >= 2 and symbol in self.PAYOUTS:
-                # Get the payout for exact count or highest available
-                payout_table = self.PAYOUTS[symbol]
-                payout = payout_table.get(count, 0)
-                
-                # Update max payout if this is better
-                if payout > max_payout:
-                    max_payout = payout
-        
-        return max_payout
+        return self.payout_table[self._table_index(symbols)][0]
     
     def _get_winning_pattern(self, symbols: List[str]) -> str:
         """
@@ -136,6 +283,19 @@ class SlotMachine:
         Returns:
             str: Description of the winning pattern or empty string if no win
         """
+        return self.payout_table[self._table_index(symbols)][1]
+    
+    def _evaluate(self, symbols: List[str]) -> Tuple[float, str]:
+        """
+        Score a set of symbols; only used to build the payout table.
+        
+        Args:
+            symbols (List[str]): List of 3 symbols
+            
+        Returns:
+            Tuple[float, str]: Payout multiplier, and description of the winning
+                pattern or empty string if no win
+        """
         # Count occurrences of each symbol (including wilds as matches)
         counts = {}
         for symbol in self.SYMBOLS:
@@ -167,16 +327,16 @@ class SlotMachine:
         
         # If no winning combination found
         if not winning_symbol or max_payout == 0:
-            return ""
+            return 0, ""
         
         # Create description of the winning pattern
         total_count, regular_count, wild_count = winning_counts
         
         if wild_count > 0:
             if winning_symbol == self.SCATTER:
-                return f"{total_count}x {winning_symbol} (Scatter)"
+                return max_payout, f"{total_count}x {winning_symbol} (Scatter)"
             else:
-                return f"{regular_count}x {winning_symbol} + {wild_count}x 🎰 (Wild)"
+                return max_payout, f"{regular_count}x {winning_symbol} + {wild_count}x {self.WILD} (Wild)"
         else:
             special = ""
             if winning_symbol == self.WILD:
@@ -184,4 +344,4 @@ class SlotMachine:
             elif winning_symbol == self.SCATTER:
                 special = " (Scatter)"
                 
-            return f"{total_count}x {winning_symbol}{special}"
+            return max_payout, f"{total_count}x {winning_symbol}{special}"
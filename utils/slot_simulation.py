@@ -0,0 +1,101 @@
+"""
+Monte Carlo analysis of the slot machine's return to player, hit rate and volatility.
+
+Spins are drawn as NumPy arrays in chunks and scored with SlotMachine's
+payout table, so tens of millions of spins take seconds. Run it with:
+
+    python -m utils.slot_simulation --spins 10000000 --seed 42
+"""
+import argparse
+import math
+from typing import Dict, Optional
+
+import numpy as np
+
+from utils.slot_machine import SlotMachine
+
+# z-score for two-sided 95% confidence intervals
+Z_95 = 1.959963984540054
+
+def simulate(machine: SlotMachine, spins: int, chunk_size: int = 1_000_000,
+             seed: Optional[int] = None, rng: Optional[np.random.Generator] = None) -> Dict[str, float]:
+    """
+    Simulate spins of the slot machine and measure its odds.
+
+    Args:
+        machine (SlotMachine): Slot machine whose weights and payout table to use
+        spins (int): Number of spins to simulate
+        chunk_size (int): Spins drawn per batch, which bounds memory use
+        seed (Optional[int]): Seed for a new random generator
+        rng (Optional[np.random.Generator]): Generator to use instead of seeding a new one
+
+    Returns:
+        Dict[str, float]: Measured RTP, hit rates, variance and 95% confidence intervals
+    """
+    rng = rng or np.random.default_rng(seed)
+
+    weights = np.array(list(machine.SYMBOL_WEIGHTS.values()), dtype=np.float64)
+    probs = weights / weights.sum()
+    n = len(probs)
+    multipliers = np.array([multiplier for multiplier, _ in machine.payout_table], dtype=np.float64)
+    max_multiplier = multipliers.max()
+
+    total = total_sq = hits = break_even = big_wins = max_wins = 0.0
+    done = 0
+    while done < spins:
+        size = min(chunk_size, spins - done)
+
+        # Draw all reels of the chunk at once and score them with one table lookup
+        reels = rng.choice(n, size=(size, 3), p=probs)
+        results = multipliers[(reels[:, 0] * n + reels[:, 1]) * n + reels[:, 2]]
+
+        total += results.sum()
+        total_sq += np.square(results).sum()
+        hits += np.count_nonzero(results > 0)
+        break_even += np.count_nonzero(results >= 1)
+        big_wins += np.count_nonzero(results >= 10)
+        max_wins += np.count_nonzero(results == max_multiplier)
+        done += size
+
+    rtp = total / spins
+    variance = total_sq / spins - rtp * rtp
+    hit_rate = hits / spins
+    rtp_margin = Z_95 * math.sqrt(variance / spins)
+    hit_margin = Z_95 * math.sqrt(hit_rate * (1 - hit_rate) / spins)
+
+    return {
+        "spins": spins,
+        "rtp": rtp,
+        "rtp_ci": (rtp - rtp_margin, rtp + rtp_margin),
+        "hit_rate": hit_rate,
+        "hit_rate_ci": (hit_rate - hit_margin, hit_rate + hit_margin),
+        "break_even_rate": break_even / spins,
+        "big_win_rate": big_wins / spins,
+        "variance": variance,
+        "max_multiplier": float(max_multiplier),
+        "max_win_rate": max_wins / spins
+    }
+
+def main() -> None:
+    """Compare simulated odds with the exact odds of the current paytable."""
+    parser = argparse.ArgumentParser(description="Simulate slot machine spins and report odds")
+    parser.add_argument("--spins", type=int, default=10_000_000, help="number of spins to simulate")
+    parser.add_argument("--chunk-size", type=int, default=1_000_000, help="spins drawn per batch")
+    parser.add_argument("--seed", type=int, default=None, help="random seed")
+    args = parser.parse_args()
+
+    machine = SlotMachine()
+    exact = machine.odds()
+    simulated = simulate(machine, args.spins, chunk_size=args.chunk_size, seed=args.seed)
+
+    print(f"{'':<22}{'exact':>12}{'simulated':>12}")
+    for key in ("rtp", "hit_rate", "break_even_rate", "big_win_rate", "variance", "max_win_rate"):
+        print(f"{key:<22}{exact[key]:>12.6f}{simulated[key]:>12.6f}")
+
+    low, high = simulated["rtp_ci"]
+    print(f"\nRTP 95% CI over {args.spins:,} spins: [{low:.6f}, {high:.6f}]")
+    low, high = simulated["hit_rate_ci"]
+    print(f"Hit rate 95% CI: [{low:.6f}, {high:.6f}]")
+
+if __name__ == "__main__":
+    main()
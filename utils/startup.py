@@ -0,0 +1,83 @@
+import time
+import logging
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class StartupTimer:
+    """
+    Measures how long the bot takes to become ready, broken down by phase.
+
+    Milestones are marked in order as startup progresses, and each phase is
+    the time between a milestone and the one before it. Work that runs in
+    the background alongside those phases, like loading user data, is
+    measured separately.
+    """
+
+    def __init__(self, started: Optional[float] = None):
+        """
+        Start timing.
+
+        Args:
+            started (Optional[float]): time.perf_counter() value startup began at, defaults to now
+        """
+        self.started = time.perf_counter() if started is None else started
+        self.marks: List[Tuple[str, float]] = []
+        self.background: Dict[str, float] = {}
+        self.reported = False
+
+    def mark(self, name: str) -> None:
+        """
+        Record that a phase of startup has finished.
+
+        Args:
+            name (str): Name of the phase that just finished
+        """
+        self.marks.append((name, time.perf_counter()))
+
+    @contextmanager
+    def measure(self, name: str) -> Iterator[None]:
+        """
+        Time a block that runs alongside the startup phases.
+
+        Args:
+            name (str): Name of the background task
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.background[name] = time.perf_counter() - started
+
+    def phases(self) -> List[Tuple[str, float]]:
+        """
+        Get the duration of each phase marked so far.
+
+        Returns:
+            List[Tuple[str, float]]: Phase names and durations in seconds, in order
+        """
+        phases = []
+        previous = self.started
+        for name, at in self.marks:
+            phases.append((name, at - previous))
+            previous = at
+        return phases
+
+    def report(self) -> str:
+        """
+        Format and log the startup timings, once.
+
+        Returns:
+            str: One-line summary of the phases and background tasks
+        """
+        total = self.marks[-1][1] - self.started if self.marks else 0.0
+        parts = [f"{name} {duration:.2f}s" for name, duration in self.phases()]
+        summary = f"Ready in {total:.2f}s ({', '.join(parts)})"
+        if self.background:
+            summary += "; in background: " + ", ".join(f"{name} {duration:.2f}s" for name, duration in self.background.items())
+
+        if not self.reported:
+            logger.info(summary)
+            self.reported = True
+        return summary
@@ -0,0 +1,315 @@
+import copy
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple, Union
+
+Balance = Union[int, float]
+
+_MISSING = object()
+
+# Highest vote number kept in the bitmap, which bounds its size to about 1.2 KB
+MAX_VOTE_NUMBER = 10_000
+
+def encode_votes(votes: Iterable[int]) -> Tuple[int, List[int]]:
+    """
+    Pack vote numbers into the bits of one integer.
+
+    Args:
+        votes (Iterable[int]): Claimed vote numbers
+
+    Returns:
+        Tuple[int, List[int]]: Bitmap with bit n set if vote n was claimed, and
+            the votes outside 0..MAX_VOTE_NUMBER, which don't fit in it
+    """
+    bits = 0
+    outside = []
+    for vote in votes:
+        if 0 <= vote <= MAX_VOTE_NUMBER:
+            bits |= 1 << vote
+        else:
+            outside.append(vote)
+    return bits, outside
+
+def decode_votes(bits: int) -> List[int]:
+    """
+    Unpack a vote bitmap into a sorted list of vote numbers.
+
+    Args:
+        bits (int): Bitmap built by encode_votes
+
+    Returns:
+        List[int]: Claimed vote numbers in ascending order
+    """
+    votes = []
+    while bits:
+        low = bits & -bits
+        votes.append(low.bit_length() - 1)
+        bits ^= low
+    return votes
+
+class UserRecord:
+    """
+    One user's data, stored in fixed slots instead of nested dicts.
+
+    Balance, the slot stats and the daily timestamp each get a slot, and vote
+    claims are packed into the bits of a single integer, stored as hex in the
+    "vote_bits" key. Keys the record doesn't know about go into `extra`, which
+    is None for almost every user. Votes above MAX_VOTE_NUMBER, which older
+    versions accepted, stay a short list under "claimed_votes" in `extra`.
+
+    The record still reads and writes like the dict it replaces, so
+    record["balance"], record["stats"]["slots_won"], "last_daily" in record
+    and record.get("claimed_votes", []) keep working in cogs and templates.
+    """
+
+    __slots__ = ("balance", "slots_played", "slots_won", "highest_win", "last_daily", "votes", "extra")
+
+    def __init__(self, balance: Balance = 0, slots_played: int = 0, slots_won: int = 0,
+                 highest_win: Optional[Balance] = None, last_daily: Optional[float] = None,
+                 votes: int = 0, extra: Optional[Dict[str, Any]] = None):
+        self.balance = balance
+        self.slots_played = slots_played
+        self.slots_won = slots_won
+        self.highest_win = highest_win  # None until the user wins something
+        self.last_daily = last_daily  # None until the first daily claim
+        self.votes = votes  # Bitmap of claimed vote numbers
+        self.extra = extra  # Any other keys, with extra stats under "stats"
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "UserRecord":
+        """
+        Build a record from the dict format used in storage.
+
+        Args:
+            data (Dict[str, Any]): User data dictionary
+
+        Returns:
+            UserRecord: The same data in a record
+        """
+        extra = dict(data)
+        stats = dict(extra.pop("stats", None) or {})
+        record = cls(
+            balance=extra.pop("balance", 0),
+            slots_played=stats.pop("slots_played", 0),
+            slots_won=stats.pop("slots_won", 0),
+            highest_win=stats.pop("highest_win", None),
+            last_daily=extra.pop("last_daily", None),
+            votes=int(extra.pop("vote_bits", "0"), 16)
+        )
+
+        # Data written before vote bitmaps lists the claimed votes instead
+        bits, outside = encode_votes(extra.pop("claimed_votes", None) or ())
+        record.votes |= bits
+        if record.votes >> (MAX_VOTE_NUMBER + 1):
+            # Bitmaps written before the limit may hold votes past it
+            outside.extend(decode_votes(record.votes >> (MAX_VOTE_NUMBER + 1) << (MAX_VOTE_NUMBER + 1)))
+            record.votes &= (1 << (MAX_VOTE_NUMBER + 1)) - 1
+        if outside:
+            extra["claimed_votes"] = sorted(outside)
+        if stats:
+            extra["stats"] = stats
+        record.extra = extra or None
+        return record
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Convert the record to the dict format used in storage.
+
+        Returns:
+            Dict[str, Any]: A new dictionary that shares nothing with the record
+        """
+        data = {"balance": self.balance, "stats": self._stats_dict()}
+        if self.last_daily is not None:
+            data["last_daily"] = self.last_daily
+        if self.votes:
+            data["vote_bits"] = format(self.votes, "x")
+        if self.extra:
+            data.update((key, copy.deepcopy(value)) for key, value in self.extra.items() if key != "stats")
+        return data
+
+    def _stats_dict(self) -> Dict[str, Any]:
+        stats = {"slots_played": self.slots_played, "slots_won": self.slots_won}
+        if self.highest_win is not None:
+            stats["highest_win"] = self.highest_win
+        if self.extra and "stats" in self.extra:
+            stats.update(self.extra["stats"])
+        return stats
+
+    def has_vote(self, vote_number: int) -> bool:
+        """Check whether a vote number has been claimed."""
+        if 0 <= vote_number <= MAX_VOTE_NUMBER:
+            return (self.votes >> vote_number) & 1 == 1
+        return bool(self.extra) and vote_number in self.extra.get("claimed_votes", ())
+
+    def add_vote(self, vote_number: int) -> None:
+        """
+        Mark a vote number as claimed.
+
+        Args:
+            vote_number (int): Vote number from 0 to MAX_VOTE_NUMBER
+
+        Raises:
+            ValueError: If the vote number is out of range
+        """
+        if not 0 <= vote_number <= MAX_VOTE_NUMBER:
+            raise ValueError(f"Vote number {vote_number} is outside 0..{MAX_VOTE_NUMBER}")
+        self.votes |= 1 << vote_number
+
+    def copy(self) -> "UserRecord":
+        """Get an independent copy of the record."""
+        return UserRecord(self.balance, self.slots_played, self.slots_won, self.highest_win,
+                          self.last_daily, self.votes, copy.deepcopy(self.extra))
+
+    def restore(self, other: "UserRecord") -> None:
+        """Overwrite every field with the fields of another record, e.g. a copy taken earlier."""
+        for name in self.__slots__:
+            setattr(self, name, getattr(other, name))
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key == "balance":
+            return self.balance
+        if key == "stats":
+            return StatsView(self)
+        if key == "last_daily":
+            return default if self.last_daily is None else self.last_daily
+        if key == "claimed_votes":
+            votes = decode_votes(self.votes)
+            if self.extra and "claimed_votes" in self.extra:
+                votes.extend(self.extra["claimed_votes"])
+            return votes or default
+        if self.extra:
+            return self.extra.get(key, default)
+        return default
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key == "balance":
+            self.balance = value
+        elif key == "stats":
+            stats = StatsView(self)
+            stats.clear()
+            stats.update(value)
+        elif key == "last_daily":
+            self.last_daily = value
+        elif key == "claimed_votes":
+            self.votes, outside = encode_votes(value)
+            if outside:
+                if self.extra is None:
+                    self.extra = {}
+                self.extra["claimed_votes"] = sorted(outside)
+            elif self.extra:
+                self.extra.pop("claimed_votes", None)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def keys(self) -> List[str]:
+        keys = [key for key in ("balance", "stats", "last_daily", "claimed_votes") if key in self]
+        if self.extra:
+            keys.extend(key for key in self.extra if key not in ("stats", "claimed_votes"))
+        return keys
+
+    def items(self) -> List[Tuple[str, Any]]:
+        return [(key, self[key]) for key in self.keys()]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return len(self.keys())
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, UserRecord):
+            return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"UserRecord({self.to_dict()!r})"
+
+class StatsView:
+    """
+    Dict-like view of a UserRecord's stats.
+
+    Reads and writes go straight to the record's slots, with stats other than
+    the known ones kept in the record's extra data.
+    """
+
+    __slots__ = ("_record",)
+
+    FIELDS = ("slots_played", "slots_won", "highest_win")
+
+    def __init__(self, record: UserRecord):
+        self._record = record
+
+    def _extra(self) -> Dict[str, Any]:
+        extra = self._record.extra
+        return extra.get("stats", {}) if extra else {}
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in self.FIELDS:
+            value = getattr(self._record, key)
+            return default if value is None else value
+        return self._extra().get(key, default)
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key in self.FIELDS:
+            setattr(self._record, key, value)
+            return
+        record = self._record
+        if record.extra is None:
+            record.extra = {}
+        record.extra.setdefault("stats", {})[key] = value
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def update(self, values: Dict[str, Any]) -> None:
+        for key, value in values.items():
+            self[key] = value
+
+    def clear(self) -> None:
+        """Reset the known stats and drop any others."""
+        record = self._record
+        record.slots_played = record.slots_won = 0
+        record.highest_win = None
+        if record.extra:
+            record.extra.pop("stats", None)
+
+    def keys(self) -> List[str]:
+        return list(self._record._stats_dict())
+
+    def items(self) -> List[Tuple[str, Any]]:
+        return list(self._record._stats_dict().items())
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return len(self.keys())
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, StatsView):
+            other = other._record._stats_dict()
+        return self._record._stats_dict() == other
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return repr(self._record._stats_dict())
@@ -0,0 +1,257 @@
+import copy
+import time
+import asyncio
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+from utils.storage import StorageBackend
+
+logger = logging.getLogger(__name__)
+
+class BackgroundWriter:
+    """
+    Persists committed changes on a background thread so disk I/O never runs
+    on the event loop.
+
+    Commits are queued as copies of the changed records, keyed by user ID, so
+    a user changed many times before the thread gets to them is written once
+    with their latest record. The thread writes everything queued as a single
+    backend write and compacts the backend when it asks for it. When idle, it
+    syncs the backend once its sync deadline passes, so a burst of writes is on
+    disk within the backend's sync interval. The queue is
+    bounded: once too many users are waiting to be written, commands await
+    wait_for_space() until the thread catches up, and the time spent waiting
+    is counted. submit() itself never blocks, since it runs on the event loop.
+    """
+
+    def __init__(self, backend: StorageBackend, max_pending: int = 10_000, retry_delay: float = 1.0):
+        """
+        Start the writer thread.
+
+        Args:
+            backend (StorageBackend): Backend to write to; only this thread uses it from now on
+            max_pending (int): Users waiting to be written before wait_for_space() waits
+            retry_delay (float): Seconds to wait before retrying a failed write
+        """
+        self.backend = backend
+        self.max_pending = max_pending
+        self.retry_delay = retry_delay
+
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._inflight: Dict[str, Dict[str, Any]] = {}  # Batch being written right now
+        self._version = 0
+        self._guild_settings: Optional[Dict[str, Dict[str, Any]]] = None  # Latest settings not written yet
+        self._cond = threading.Condition()
+        self._closed = False
+        self._sync_requested = 0  # Incremented by every flush() call
+        self._synced = 0  # Latest flush() request that has been synced
+        self._space_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+        self._stats = {
+            "commits": 0,  # Commits submitted
+            "coalesced": 0,  # Records replaced in the queue before being written
+            "batches": 0,  # Backend writes
+            "compactions": 0,
+            "records_written": 0,
+            "write_seconds": 0.0,  # Total time spent in backend writes and compactions
+            "max_batch": 0,
+            "max_queue_depth": 0,
+            "stalls": 0,  # Commands that waited because the queue was full
+            "stall_seconds": 0.0,
+            "errors": 0,
+        }
+
+        self._thread = threading.Thread(target=self._run, name="data-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, records: Dict[str, Dict[str, Any]], version: int) -> None:
+        """
+        Queue the records changed by one commit.
+
+        Args:
+            records (Dict[str, Dict[str, Any]]): Copies of the changed records; they must not be mutated afterwards
+            version (int): Version number of the commit
+        """
+        with self._cond:
+            for user_id, record in records.items():
+                if user_id in self._pending:
+                    self._stats["coalesced"] += 1
+                self._pending[user_id] = record
+            self._version = version
+            self._stats["commits"] += 1
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], len(self._pending))
+            self._cond.notify_all()
+
+    def submit_guild_settings(self, settings: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Queue the per-guild settings to replace the stored ones.
+
+        Args:
+            settings (Dict[str, Dict[str, Any]]): Copy of every guild's settings; it must not be mutated afterwards
+        """
+        with self._cond:
+            self._guild_settings = settings
+            self._cond.notify_all()
+
+    async def wait_for_space(self) -> None:
+        """Wait without blocking the event loop until the queue has room for more commits."""
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            if len(self._pending) < self.max_pending or self._closed:
+                return
+            space = loop.create_future()
+            self._space_waiters.append((loop, space))
+            self._stats["stalls"] += 1
+
+        started = time.monotonic()
+        try:
+            await space
+        finally:
+            with self._cond:
+                self._stats["stall_seconds"] += time.monotonic() - started
+
+    def _wake_space_waiters(self) -> None:
+        """Resume every command waiting for queue space; call with the condition held."""
+        waiters, self._space_waiters = self._space_waiters, []
+        for loop, space in waiters:
+            try:
+                loop.call_soon_threadsafe(_resolve, space)
+            except RuntimeError:
+                pass  # The loop has closed
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until everything submitted so far is written and synced to disk.
+
+        Args:
+            timeout (Optional[float]): Maximum seconds to wait, or None to wait indefinitely
+
+        Returns:
+            bool: Whether the flush completed within the timeout
+        """
+        with self._cond:
+            self._sync_requested += 1
+            request = self._sync_requested
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: self._synced >= request, timeout)
+
+    def close(self, timeout: Optional[float] = 30.0) -> None:
+        """
+        Flush pending changes and stop the writer thread.
+
+        Args:
+            timeout (Optional[float]): Maximum seconds to wait for the flush
+        """
+        if not self.flush(timeout):
+            logger.error(f"Timed out flushing data writes, {len(self._pending)} users not written")
+        with self._cond:
+            self._closed = True
+            self._wake_space_waiters()
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def pending_record(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the latest record of a user that isn't committed to the backend yet.
+
+        Args:
+            user_id (str): Discord user ID
+
+        Returns:
+            Optional[Dict[str, Any]]: Copy of the queued or in-flight record, or None if there is none
+        """
+        with self._cond:
+            record = self._pending.get(user_id, self._inflight.get(user_id))
+        return copy.deepcopy(record)
+
+    def pending_records(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get every record that isn't committed to the backend yet.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Latest queued or in-flight record by user ID; treat as read-only
+        """
+        with self._cond:
+            return {**self._inflight, **self._pending}
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get counters describing the writer's throughput and backpressure.
+
+        Returns:
+            Dict[str, Any]: Counters since start, plus the current queue depth
+        """
+        with self._cond:
+            stats = dict(self._stats)
+            stats["queue_depth"] = len(self._pending)
+            stats["version"] = self._version
+            stats["bytes_written"] = self.backend.bytes_written
+        return stats
+
+    def _run(self) -> None:
+        """Write queued batches until closed."""
+        while True:
+            with self._cond:
+                sync_due = False
+                while not (self._pending or self._guild_settings is not None
+                           or self._sync_requested > self._synced or self._closed):
+                    # Sync writes the backend left unsynced once they are due,
+                    # rather than waiting for the next write to do it
+                    deadline = self.backend.sync_deadline()
+                    timeout = None if deadline is None else deadline - time.monotonic()
+                    if timeout is not None and timeout <= 0:
+                        sync_due = True
+                        break
+                    self._cond.wait(timeout)
+                if self._closed and not self._pending and self._guild_settings is None:
+                    return
+
+                batch, self._pending = self._pending, {}
+                guild_settings, self._guild_settings = self._guild_settings, None
+                self._inflight = batch
+                version = self._version
+                sync_request = self._sync_requested
+                self._wake_space_waiters()
+                self._cond.notify_all()
+
+            try:
+                started = time.monotonic()
+                if batch:
+                    self.backend.write(batch, version)
+                    if self.backend.needs_compaction():
+                        self.backend.compact(None, version)
+                        with self._cond:
+                            self._stats["compactions"] += 1
+                if guild_settings is not None:
+                    self.backend.write_guild_settings(guild_settings)
+                    guild_settings = None
+                if sync_request > self._synced or sync_due:
+                    self.backend.sync()
+                elapsed = time.monotonic() - started
+            except Exception as e:
+                logger.error(f"Error writing data: {str(e)}")
+                with self._cond:
+                    self._stats["errors"] += 1
+                    # Requeue the batch without overwriting anything committed since
+                    for user_id, record in batch.items():
+                        self._pending.setdefault(user_id, record)
+                    self._inflight = {}
+                    if self._guild_settings is None:
+                        self._guild_settings = guild_settings
+                time.sleep(self.retry_delay)
+                continue
+
+            with self._cond:
+                self._inflight = {}
+                self._synced = max(self._synced, sync_request)
+                if batch:
+                    self._stats["batches"] += 1
+                    self._stats["records_written"] += len(batch)
+                    self._stats["max_batch"] = max(self._stats["max_batch"], len(batch))
+                self._stats["write_seconds"] += elapsed
+                self._cond.notify_all()
+
+def _resolve(future: asyncio.Future) -> None:
+    """Mark a waiter's future done unless it was cancelled."""
+    if not future.done():
+        future.set_result(None)